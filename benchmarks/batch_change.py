@@ -0,0 +1,91 @@
+"""
+Batch change computation vs scalar change calculation, scenarios per second. Requires numpy
+
+Usage:
+    $ python -m benchmarks.batch_change
+    $ python -m benchmarks.batch_change --scenarios 1000000 --scalar 20000
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from package.batch import batchChange
+from package.catalog import ITEMS
+from package.change import ChangeCache, OptimalChangeSolver
+from package.model import Machine, Product
+from package.money import Money
+
+MAX_COINS = 20
+# customers pay up to this much over the price, in minor units
+MAX_OVERPAY = 2000
+
+
+def report(name: str, scenarios: int, seconds: float) -> None:
+    print(f"{name:<40}{scenarios:>10}{scenarios / seconds:>16,.0f}")
+
+
+def run(scenarios: int, scalar: int, seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    prices = np.array([Money.of(item["price"], "PLN").minor for item in ITEMS], dtype=np.int64)
+    amounts = rng.integers(0, MAX_OVERPAY, scenarios)
+    prices = prices[rng.integers(0, len(prices), scenarios)]
+
+    # cache is disabled, every scenario is solved
+    machine = Machine(changeCache=ChangeCache(maxsize=0))
+    store = machine.inventory.getStore("PLN")
+    random.seed(seed)
+    for denomination in store.denominations:
+        denomination.amount = random.randint(0, MAX_COINS)
+    values = [denomination.value.minor for denomination in store.denominations]
+    limits = [denomination.amount for denomination in store.denominations]
+    print(f"store {dict(zip(values, limits))}")
+    print(f"{'path':<40}{'scenarios':>10}{'scenarios/s':>16}")
+
+    # scalar path takes coins out of the store, so they are put back after every scenario
+    model = machine.session()
+    model.selectedProduct = Product("Kawa", Decimal("0.00"))
+    started = time.perf_counter()
+    for index in range(scalar):
+        model.selectedProduct.price = Money(int(prices[index]), "PLN")
+        model.enteredAmount = Money(int(prices[index] + amounts[index]), "PLN")
+        change = model.calculateChange()
+        if change is not None:
+            for denomination in change:
+                machine.inventory.credit("PLN", denomination.value, denomination.amount)
+    report("Core.calculateChange", scalar, time.perf_counter() - started)
+
+    solver = OptimalChangeSolver()
+    started = time.perf_counter()
+    solved = [solver.solve(amount, values, limits) for amount in amounts[:scalar].tolist()]
+    report("OptimalChangeSolver.solve", scalar, time.perf_counter() - started)
+
+    for exact in (False, True):
+        started = time.perf_counter()
+        result = batchChange(amounts, values, limits, exact=exact)
+        name = "batchChange" + (" (scalar fallback)" if exact else " (greedy only)")
+        report(name, scenarios, time.perf_counter() - started)
+        print(f"{'':<4}failure rate {result.failureRate:.4f}, mean coins {result.coins[result.feasible].mean():.2f}")
+
+    # batch results must be the ones scalar solver gives
+    for index, expected in enumerate(solved):
+        assert bool(result.feasible[index]) == (expected is not None), f"feasibility differs at {amounts[index]}"
+        if expected is not None:
+            assert int(result.coins[index]) == sum(expected), f"coin count differs at {amounts[index]}"
+            assert int(result.counts[index] @ np.array(values)) == amounts[index]
+    print(f"batch matches scalar solver on {len(solved)} scenarios")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Batch change benchmark")
+    parser.add_argument("--scenarios", type=int, default=1_000_000, help="scenarios solved in batch")
+    parser.add_argument("--scalar", type=int, default=20_000, help="scenarios solved one by one")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.scenarios, args.scalar, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Change solver latency benchmark
+
+Usage:
+    $ python -m benchmarks.change_solver
+"""
+import random
+import time
+from typing import List
+
+from package.change import GreedyChangeSolver, OptimalChangeSolver
+from package.model import StorePLN, StoreUSD, StoreEUR
+
+ROUNDS = 2000
+MAX_CHANGE = 500 * 100  # 500.00 in minor units
+MAX_COINS = 200
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+def run() -> None:
+    rng = random.Random(42)
+    solvers = [("greedy", GreedyChangeSolver()), ("optimal", OptimalChangeSolver())]
+
+    print(f"{'store':<6}{'solver':<10}{'p50 us':>10}{'p99 us':>10}{'max us':>10}{'failed':>8}")
+    for store in (StorePLN(), StoreUSD(), StoreEUR()):
+        values = [denomination.value.minor for denomination in store.denominations]
+        scenarios = [(rng.randint(1, MAX_CHANGE), [rng.randint(0, MAX_COINS) for _ in values])
+                     for _ in range(ROUNDS)]
+
+        for name, solver in solvers:
+            samples = []
+            failed = 0
+            for amount, limits in scenarios:
+                start = time.perf_counter()
+                counts = solver.solve(amount, values, limits)
+                samples.append((time.perf_counter() - start) * 1e6)
+                failed += counts is None
+            print(f"{store.currency:<6}{name:<10}{percentile(samples, 50):>10.1f}"
+                  f"{percentile(samples, 99):>10.1f}{max(samples):>10.1f}{failed:>8}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,86 @@
+"""
+Coin acceptor ingestion throughput: simulated device bursts through CoinAcceptor into TransactionEngine,
+batched insertCoins vs one insertCoin per coin. Headless, consumer runs on its own thread instead of Qt
+
+Usage:
+    $ python -m benchmarks.coin_ingest
+    $ python -m benchmarks.coin_ingest --coins 50000 --burst 20 --repeats 1
+"""
+import argparse
+import threading
+import time
+
+from package.acceptor import CoinAcceptor, CoinDeviceSimulator
+from package.engine import TransactionEngine
+from package.model import ACCEPTED_COINS, Core
+from package.money import Money
+
+
+def cashEngine(coins: int) -> TransactionEngine:
+    engine = TransactionEngine(Core())
+    # price is never reached, so change checks stay out of the measurement
+    engine.selectProduct("Kawa", Money.of(coins * 5 + 1, "PLN"))
+    engine.chooseCurrency("PLN")
+    engine.choosePaymentType("cash")
+    return engine
+
+
+def run(coins: int, burst: int, repeats: int, batched: bool) -> None:
+    simulator = CoinDeviceSimulator()
+    channels = [simulator.channel(Money.of(value, "PLN")) for value in ACCEPTED_COINS["PLN"]]
+    ready = threading.Event()
+    acceptor = CoinAcceptor(simulator.path, onBatch=ready.set, enabled=True)
+    engine = cashEngine(coins)
+    latencies = []
+    inserted = 0
+
+    def consume() -> None:
+        nonlocal inserted
+        while inserted < coins:
+            if not ready.wait(1.0):
+                break
+            ready.clear()
+            for batch in acceptor.take():
+                if batched:
+                    engine.insertCoins(batch.coins)
+                else:
+                    for coin in batch.coins:
+                        engine.insertCoin(coin)
+                inserted += len(batch.coins)
+                latencies.append(time.perf_counter() - batch.received)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    started = time.perf_counter()
+    sent = 0
+    while sent < coins:
+        count = min(burst, coins - sent)
+        if simulator.insert([channels[(sent + index) % len(channels)] for index in range(count)], repeats):
+            sent += count
+        else:  # device is inhibited by back-pressure, customer inserts the coins again
+            time.sleep(0.001)
+    consumer.join()
+    elapsed = time.perf_counter() - started
+    acceptor.close()
+    simulator.close()
+
+    latencies.sort()
+    name = "insertCoins (batched)" if batched else "insertCoin (per coin)"
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3 if latencies else float("nan")
+    print(f"{name:<24}{inserted:>10}{inserted / elapsed:>12,.0f}{len(latencies):>10}{p99:>12.2f}"
+          f"{acceptor.pauses:>8}{simulator.returned:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Coin acceptor ingestion benchmark")
+    parser.add_argument("--coins", type=int, default=20_000)
+    parser.add_argument("--burst", type=int, default=10, help="coins per device write")
+    parser.add_argument("--repeats", type=int, default=0, help="repeated frames per coin")
+    args = parser.parse_args()
+    print(f"{'path':<24}{'coins':>10}{'coins/s':>12}{'batches':>10}{'p99 ms':>12}{'pauses':>8}{'returned':>10}")
+    for batched in (False, True):
+        run(args.coins, args.burst, args.repeats, batched)
+
+
+if __name__ == '__main__':
+    main()
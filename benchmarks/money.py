@@ -0,0 +1,90 @@
+"""
+Decimal vs integer minor units (Money) on change calculation and card payment
+
+Usage:
+    $ python -m benchmarks.money
+"""
+import timeit
+from decimal import Decimal
+
+from package.ledger import Ledger
+from package.model import Card, Machine, Product, StorePLN
+
+NUMBER = 20000
+
+
+def decimalChange(toPay: Decimal, denominations) -> list:
+    """
+    Greedy change loop on Decimal values, as it was done before Money type
+    """
+    change = []
+    for value, amount in denominations:
+        if toPay <= 0:
+            break
+        number = int(toPay // value)
+        if 0 < number <= amount:
+            toPay = toPay - (value * number)
+            change.append((value, number))
+    return change
+
+
+def moneyChange(toPay: int, denominations) -> list:
+    """
+    Same greedy change loop on integer minor units
+    """
+    change = []
+    for value, amount in denominations:
+        if toPay <= 0:
+            break
+        number = toPay // value
+        if 0 < number <= amount:
+            toPay -= value * number
+            change.append((value, number))
+    return change
+
+
+def report(name: str, seconds: float) -> None:
+    print(f"{name:<40}{seconds / NUMBER * 1e6:>10.2f} us")
+
+
+def run() -> None:
+    store = StorePLN()
+    for denomination in store.denominations:
+        denomination.amount = 20
+    decimalDenominations = [(denomination.value.toDecimal(), denomination.amount)
+                            for denomination in store.denominations]
+    moneyDenominations = [(denomination.value.minor, denomination.amount) for denomination in store.denominations]
+
+    report("change loop, Decimal", timeit.timeit(
+        lambda: decimalChange(Decimal("13.88"), decimalDenominations), number=NUMBER))
+    report("change loop, minor units", timeit.timeit(
+        lambda: moneyChange(1388, moneyDenominations), number=NUMBER))
+
+    decimalBalance = Decimal("200.00")
+    price = Decimal("4.00")
+    report("card debit, Decimal", timeit.timeit(
+        lambda: (decimalBalance - price).quantize(Decimal('0.01')), number=NUMBER))
+    card = Card("1", Decimal("200.00"), "PLN")
+    moneyPrice = Product("Snickers", price).getConvertedPrice(card.currency)
+    report("card debit, Money", timeit.timeit(lambda: card.balance - moneyPrice, number=NUMBER))
+
+    machine = Machine()
+    for store in machine.inventory.stores.values():
+        for denomination in store.denominations:
+            denomination.amount = 10 ** 9
+    model = machine.session()
+    model.selectedProduct = Product("Kawa", Decimal("2.00"))
+    model.insertDenomination(Decimal("5.00"))
+    report("Core.calculateChange", timeit.timeit(model.calculateChange, number=NUMBER))
+
+    for account in machine.accounts:
+        for card in account.cards:
+            card.balance = card.balance * 10 ** 6
+    model.selectedAccount = machine.accounts[0]
+    model.selectedCard = machine.accounts[0].cards[0]
+    machine.ledger = Ledger(machine.accounts)
+    report("Core.processCardPayment", timeit.timeit(model.processCardPayment, number=NUMBER))
+
+
+if __name__ == '__main__':
+    run()
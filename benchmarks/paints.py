@@ -0,0 +1,53 @@
+"""
+Paints per user action in a full cash purchase and a card purchase, on offscreen Qt platform
+
+Usage:
+    $ python -m benchmarks.paints
+"""
+import json
+import os
+import sys
+
+
+def main() -> None:
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+
+    from package.controller import Controller
+    from package.model import Core
+    from package.view import Window
+    from package.view.updates import PaintCounter
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    view = Window()
+    Controller(view=view, model=Core())
+    view.show()
+    app.processEvents()
+
+    counter = PaintCounter().install()
+    menu = view.displayMenu
+    steps = [
+        ("product", lambda: view.productsMenu.productButtons[0].click()),
+        ("currency", lambda: menu.currencySelectMenu.buttonPLN.click()),
+        ("cash", lambda: menu.paymentTypeMenu.buttonPaymentCash.click()),
+        ("coin", lambda: menu.cashPaymentMenu.buttonCash4.click()),
+        ("submit", lambda: menu.cashPaymentMenu.submitButton.click()),
+        ("reset", lambda: menu.cashPaymentResultMenu.buttonReset.click()),
+        ("cardProduct", lambda: view.productsMenu.productButtons[0].click()),
+        ("cardCurrency", lambda: menu.currencySelectMenu.buttonPLN.click()),
+        ("card", lambda: menu.paymentTypeMenu.buttonPaymentCard.click()),
+        ("cardPay", lambda: menu.cardPaymentMenu.buttonPayment.click()),
+        ("cardReset", lambda: menu.cardPaymentMenu.buttonReset.click())
+    ]
+    for name, step in steps:
+        with counter.action(name):
+            step()
+    counter.uninstall()
+
+    json.dump({"actions": counter.actions, "total": sum(counter.actions.values()),
+               "byWidget": dict(counter.paints.most_common())}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
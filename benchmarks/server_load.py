@@ -0,0 +1,147 @@
+"""
+Load generator for package.server. Opens many concurrent client connections, each one repeatedly
+buying a product with cash, and reports requests per second and latency percentiles as JSON.
+Starts its own server process unless --port or --unix points to a running one
+
+Usage:
+    $ python -m benchmarks.server_load --clients 100 --seconds 10
+    $ python -m benchmarks.server_load --port 8765
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from package.catalog import ITEMS
+
+# coin paid in by the customer, one per currency
+COINS = {
+    "PLN": "5.00",
+    "USD": "1.00",
+    "EUR": "2.00"
+}
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+async def connect(host: str, port: Optional[int], path: Optional[str]):
+    if path is not None:
+        return await asyncio.open_unix_connection(path)
+    return await asyncio.open_connection(host, port)
+
+
+async def client(number: int, address: Dict, deadline: float, latencies: List[float], stats: Dict) -> None:
+    """
+    One customer buying products over and over until deadline
+    """
+    reader, writer = await connect(**address)
+    currencies = list(COINS)
+    requestId = 0
+
+    async def call(op: str, **fields) -> Dict:
+        nonlocal requestId
+        requestId += 1
+        start = time.perf_counter()
+        writer.write(json.dumps({"id": requestId, "op": op, **fields}).encode() + b"\n")
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        if not response["ok"]:
+            stats["errors"][op] = stats["errors"].get(op, 0) + 1
+        return response
+
+    purchase = number
+    while time.perf_counter() < deadline:
+        item = ITEMS[purchase % len(ITEMS)]
+        currency = currencies[purchase % len(currencies)]
+        purchase += 1
+
+        if not (await call("select", name=item["name"]))["ok"]:
+            # sold out, customer picks another product
+            continue
+        await call("currency", currency=currency)
+        response = await call("payment", type="cash")
+        price = response["result"]["product"]["price"]
+        entered = response["result"]["enteredAmount"]
+        while Decimal(entered) < Decimal(price):
+            entered = (await call("coin", value=COINS[currency]))["result"]["enteredAmount"]
+        await call("pay")
+        await call("reset")
+        stats["purchases"] += 1
+
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(address: Dict, clients: int, seconds: float) -> Dict:
+    latencies: List[float] = []
+    stats = {"purchases": 0, "errors": {}}
+    started = time.perf_counter()
+    await asyncio.gather(*(client(number, address, started + seconds, latencies, stats)
+                           for number in range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    return {
+        "clients": clients,
+        "seconds": elapsed,
+        "requests": len(latencies),
+        "requestsPerSecond": len(latencies) / elapsed,
+        "purchasesPerSecond": stats["purchases"] / elapsed,
+        # failed requests by operation, e.g. payments machine couldn't give change for
+        "errors": stats["errors"],
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000
+    }
+
+
+def startServer() -> (subprocess.Popen, int):
+    """
+    Starts server process on a free port
+    :return: server process and its port
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    # slots never run out, so every client keeps buying
+    process = subprocess.Popen([sys.executable, "-m", "package.server", "--port", str(port),
+                                "--slot-capacity", str(10 ** 9)],
+                               stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # server prints a line once it listens
+    process.stdout.readline()
+    return process, port
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vending machine server load generator")
+    parser.add_argument("--clients", type=int, default=100, help="concurrent connections")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="port of running server")
+    parser.add_argument("--unix", help="Unix socket of running server")
+    args = parser.parse_args()
+
+    process = None
+    port = args.port
+    if port is None and args.unix is None:
+        process, port = startServer()
+    try:
+        report = asyncio.run(run({"host": args.host, "port": port, "path": args.unix}, args.clients, args.seconds))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+GUI startup benchmark: time from interpreter start to first paint of the main window,
+measured in fresh processes on offscreen Qt platform. --eager creates every menu and dialog up front,
+as the GUI did before menus became lazy, so both can be compared on one commit
+
+Usage:
+    $ python -m benchmarks.startup --runs 10
+    $ python -m benchmarks.startup --runs 10 --eager
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(eager: bool) -> None:
+    """
+    Starts the GUI and prints seconds from process start to the first window paint
+    """
+    from PyQt5.QtCore import QEvent, QObject
+    from PyQt5.QtWidgets import QApplication
+
+    from package.controller import Controller
+    from package.model import Core
+    from package.view import Window
+
+    class PaintWatcher(QObject):
+        def eventFilter(self, watched, event) -> bool:
+            if event.type() == QEvent.Paint:
+                print(json.dumps({"firstPaint": time.perf_counter() - started, "constructed": constructed,
+                                  "window": window}), flush=True)
+                app.exit(0)
+            return False
+
+    app = QApplication(sys.argv)
+    windowStarted = time.perf_counter()
+    view = Window()
+    Controller(view=view, model=Core())
+    if eager:
+        for name in view.displayMenu.menuClasses:
+            view.displayMenu.menu(name)
+        view.displayMenu.cashPaymentResultMenu.changeDialog
+        view.displayMenu.cashPaymentResultMenu.denominationsDialog
+    constructed = time.perf_counter() - started
+    window = time.perf_counter() - windowStarted
+
+    watcher = PaintWatcher()
+    view.centralWidget().installEventFilter(watcher)
+    view.show()
+    app.exec_()
+
+
+def run(eager: bool, runs: int) -> dict:
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    samples = []
+    for _ in range(runs):
+        command = [sys.executable, "-m", "benchmarks.startup", "--child"] + (["--eager"] if eager else [])
+        output = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    report = {"eager": eager, "runs": runs}
+    # firstPaint and constructed include interpreter and PyQt imports, window is views and controllers only
+    for key in ("firstPaint", "constructed", "window"):
+        values = [sample[key] * 1000 for sample in samples]
+        report[f"{key}_ms"] = {"median": statistics.median(values), "min": min(values), "max": max(values)}
+    return report
+
+
+if __name__ == '__main__':
+    # measured from the earliest point we control in the child process
+    started = time.perf_counter()
+
+    parser = argparse.ArgumentParser(description="Vending machine GUI startup benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--eager", action="store_true", help="create all menus and dialogs up front")
+    parser.add_argument("--both", action="store_true", help="compare lazy and eager startup")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.eager)
+    else:
+        modes = [False, True] if args.both else [args.eager]
+        json.dump([run(eager, args.runs) for eager in modes], sys.stdout, indent=2)
+        print()
@@ -0,0 +1,168 @@
+"""
+Transaction benchmark suite. Results are printed as JSON, so runs on different commits can be compared
+
+Usage:
+    $ python -m benchmarks.suite
+    $ python -m benchmarks.suite --qt --rounds 5000 --output results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
+
+from package.ledger import Ledger
+from package.model import Core, Machine, Product
+from package.money import Money
+from package.stock import SlotStock
+
+CURRENCIES = ["PLN", "USD", "EUR"]
+# coin values paid in by the benchmark customer, one per currency
+COINS = {
+    "PLN": Decimal("5.00"),
+    "USD": Decimal("1.00"),
+    "EUR": Decimal("2.00")
+}
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+def measure(name: str, currency: Optional[str], action: Callable[[], object], rounds: int) -> Dict:
+    """
+    Runs action given number of times
+    :return: throughput and latency percentiles in microseconds
+    """
+    samples = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        start = time.perf_counter()
+        action()
+        samples.append((time.perf_counter() - start) * 1e6)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+
+    return {
+        "name": name,
+        "currency": currency,
+        "rounds": rounds,
+        "throughput": rounds / elapsed,
+        "p50_us": percentile(samples, 50),
+        "p90_us": percentile(samples, 90),
+        "p99_us": percentile(samples, 99),
+        "max_us": samples[-1]
+    }
+
+
+def createModel(currency: str) -> Core:
+    """
+    Session with product bought for one coin and machine which never runs out of coins, card funds or products
+    """
+    machine = Machine(stock=SlotStock(capacity=10 ** 9))
+    for store in machine.inventory.stores.values():
+        for denomination in store.denominations:
+            denomination.amount = 10 ** 9
+    for account in machine.accounts:
+        for card in account.cards:
+            card.balance = Money(10 ** 12, card.currency)
+    machine.ledger = Ledger(machine.accounts)
+
+    model = machine.session()
+    model.selectedProduct = Product("Kawa", Decimal("2.00"))
+    model.selectedProduct.convertCurrency(currency)
+    model.insertDenomination(COINS[currency])
+    card = next(card for account in machine.accounts for card in account.cards if card.currency == currency)
+    model.selectedAccount = next(account for account in machine.accounts if card in account.cards)
+    model.selectedCard = card
+    return model
+
+
+def modelBenchmarks(rounds: int) -> List[Dict]:
+    results = []
+    for currency in CURRENCIES:
+        model = createModel(currency)
+        change = model.calculateChange()
+        product = Product("Snickers", Decimal("4.00"))
+
+        results.append(measure("Core.calculateChange", currency, model.calculateChange, rounds))
+        results.append(measure("Core.processCashPayment", currency, model.processCashPayment, rounds))
+        results.append(measure("Core.processCardPayment", currency, model.processCardPayment, rounds))
+        results.append(measure("Product.getConvertedPrice", currency,
+                               lambda: product.getConvertedPrice(currency), rounds))
+        results.append(measure("Core.changeToTable", currency, lambda: model.changeToTable(change), rounds))
+    return results
+
+
+def qtBenchmarks(rounds: int) -> List[Dict]:
+    """
+    Full controller click path: product, currency, cash, coin, submit, reset. Runs on offscreen Qt platform
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+
+    from package.controller import Controller
+    from package.view import Window
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    for currency in CURRENCIES:
+        view = Window()
+        model = createModel(currency)
+        model.reset()
+        Controller(view=view, model=model)
+        menu = view.displayMenu
+
+        def click() -> None:
+            view.productsMenu.productButtons[0].click()
+            getattr(menu.currencySelectMenu, f"button{currency}").click()
+            menu.paymentTypeMenu.buttonPaymentCash.click()
+            menu.cashPaymentMenu.buttonCash4.click()
+            menu.cashPaymentMenu.submitButton.click()
+            menu.cashPaymentResultMenu.buttonReset.click()
+            app.processEvents()
+
+        results.append(measure("Controller.cashPurchase", currency, click, rounds))
+    return results
+
+
+def revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vending machine transaction benchmarks")
+    parser.add_argument("--rounds", type=int, default=2000, help="iterations per benchmark")
+    parser.add_argument("--qt", action="store_true", help="also benchmark Qt controller click path")
+    parser.add_argument("--output", help="write JSON to file instead of stdout")
+    args = parser.parse_args()
+
+    results = modelBenchmarks(args.rounds)
+    if args.qt:
+        results += qtBenchmarks(max(1, args.rounds // 10))
+
+    report = {
+        "revision": revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
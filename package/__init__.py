@@ -3,6 +3,9 @@ import sys
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Machine state (coin inventory etc.) lives outside of the bundle
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".vending-machine")
+
 
 # Translate asset paths to useable format for PyInstaller
 def resource_path(relative_path):
@@ -0,0 +1,396 @@
+"""
+Coin acceptor ingestion. Coin events are read from a serial device on a background asyncio thread,
+decoded, de-duplicated and handed over in batches through a bounded queue.
+
+Device protocol is line based ASCII, one frame per accepted coin:
+    <counter>:<channel>\\n
+counter - event counter 1..255, wraps to 1, 0 after device reset. Validators repeat last frame until they are
+          polled again, so frames with the last seen counter are dropped, gaps are counted as lost events
+channel - coin channel, see DEFAULT_CHANNELS
+Host can write 'I\\n' to inhibit the device (coins are returned to the customer) and 'E\\n' to enable it again.
+The device is inhibited until the consumer enables it with setEnabled, and while the queue is full.
+Coins accepted before the device reads the inhibit command are still reported, so consumer must refund them.
+
+Serial device access needs termios, so the module is POSIX only.
+CoinDeviceSimulator emulates the device on a pseudo terminal, for local testing:
+    $ python -m package.acceptor --rate 5 --burst 3
+    $ VENDING_COIN_DEVICE=/dev/pts/3 python main.py
+"""
+import argparse
+import asyncio
+import os
+import queue
+import random
+import select
+import termios
+import threading
+import time
+import tty
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .metrics import METRICS
+from .model import ACCEPTED_COINS
+from .money import Money
+
+# coin of every channel, channels are numbered from 1 in ACCEPTED_COINS order
+DEFAULT_CHANNELS: Dict[int, Money] = {
+    channel: coin for channel, coin in enumerate(
+        (Money.of(value, currency) for currency, values in ACCEPTED_COINS.items() for value in values), start=1)
+}
+
+INHIBIT = b"I\n"
+ENABLE = b"E\n"
+
+# frames longer than this are device noise
+FRAME_LIMIT = 16
+# event counter wraps from COUNTER_MAX to 1
+COUNTER_MAX = 255
+
+
+@dataclass
+class CoinBatch:
+    """
+    Coins read from device in one batch window
+    received - perf_counter of the first coin, to measure ingestion latency
+    """
+    coins: List[Money] = field(default_factory=list)
+    received: float = 0.0
+
+
+class FrameDecoder:
+    """
+    Decodes device byte stream into coins, dropping repeated frames and noise
+    """
+
+    def __init__(self, channels: Dict[int, Money] = DEFAULT_CHANNELS) -> None:
+        self.channels = channels
+        self.lastCounter: Optional[int] = None
+        self._buffer = b""
+        self.events = 0
+        self.repeats = 0
+        self.lost = 0
+        self.noise = 0
+
+    def feed(self, data: bytes) -> List[Money]:
+        """
+        :param data: bytes read from device
+        :return: coins of complete frames
+        """
+        lines = (self._buffer + data).split(b"\n")
+        self._buffer = lines.pop()
+        if len(self._buffer) > FRAME_LIMIT:
+            self._buffer = b""
+            self.noise += 1
+        coins = []
+        for line in lines:
+            coin = self._decode(line.strip())
+            if coin is not None:
+                coins.append(coin)
+        return coins
+
+    def _decode(self, frame: bytes) -> Optional[Money]:
+        counter, _, channel = frame.partition(b":")
+        try:
+            counter, channel = int(counter), int(channel)
+        except ValueError:
+            self.noise += 1
+            return None
+        if channel not in self.channels or not 0 <= counter <= COUNTER_MAX:
+            self.noise += 1
+            return None
+
+        if counter == self.lastCounter:
+            self.repeats += 1
+            return None
+        if self.lastCounter is not None and counter != 0:
+            self.lost += (counter - self.lastCounter - 1) % COUNTER_MAX
+        self.lastCounter = counter
+        self.events += 1
+        return self.channels[channel]
+
+
+class CoinAcceptor:
+    """
+    Reads coin device on background thread with its own asyncio loop.
+    Coins are collected for batchWindow seconds (or up to maxBatch coins) and put to queue of at most
+    maxPending batches. Consumer is notified with onBatch from the reader thread and takes batches with take().
+    onBatch isn't called again until take() is, so the consumer isn't flooded with notifications.
+    Device accepts coins only while it's enabled by the consumer and reading isn't paused by back-pressure
+    """
+
+    def __init__(self, path: str, channels: Dict[int, Money] = DEFAULT_CHANNELS, batchWindow: float = 0.02,
+                 maxBatch: int = 32, maxPending: int = 8, onBatch: Optional[Callable[[], None]] = None,
+                 enabled: bool = False) -> None:
+        self.path = path
+        self.decoder = FrameDecoder(channels)
+        self.batchWindow = batchWindow
+        self.maxBatch = maxBatch
+        self.onBatch = onBatch
+        self.batches: "queue.Queue[CoinBatch]" = queue.Queue(maxsize=maxPending)
+        self.enabled = enabled
+        self.paused = False
+        self.pauses = 0
+        # coins which consumer couldn't insert and paid back
+        self.refunded = 0
+
+        self._batch = CoinBatch()
+        self._flushHandle: Optional[asyncio.TimerHandle] = None
+        self._notified = False
+        self._notifyLock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            tty.setraw(self._fd)
+        except termios.error:  # not a terminal, e.g. named pipe
+            pass
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="coin-acceptor", daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.add_reader(self._fd, self._read)
+        self._write(ENABLE if self.enabled else INHIBIT)
+        self._loop.call_soon(self._started.set)
+        self._loop.run_forever()
+        self._loop.close()
+
+    def _write(self, command: bytes) -> None:
+        try:
+            os.write(self._fd, command)
+        except BlockingIOError:  # device doesn't read commands, nothing to do about it
+            pass
+
+    def _read(self) -> None:
+        try:
+            data = os.read(self._fd, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:  # device went away, e.g. simulator closed
+            data = b""
+        if not data:
+            self._loop.remove_reader(self._fd)
+            return
+
+        coins = self.decoder.feed(data)
+        if not coins:
+            return
+        METRICS.increment("coin_events", len(coins))
+        if not self._batch.coins:
+            self._batch.received = time.perf_counter()
+        self._batch.coins.extend(coins)
+        if len(self._batch.coins) >= self.maxBatch:
+            self._flush()
+        elif self._flushHandle is None:
+            self._flushHandle = self._loop.call_later(self.batchWindow, self._flush)
+
+    def _flush(self) -> None:
+        if self._flushHandle is not None:
+            self._flushHandle.cancel()
+            self._flushHandle = None
+        if not self._batch.coins:
+            return
+        try:
+            self.batches.put_nowait(self._batch)
+        except queue.Full:
+            self._pause()
+            return
+        self._batch = CoinBatch()
+        self._notify()
+
+    def _pause(self) -> None:
+        """
+        Back-pressure: consumer is behind, so coins are left in the device until it catches up
+        """
+        if self.paused:
+            return
+        self.paused = True
+        self.pauses += 1
+        METRICS.increment("coin_backpressure")
+        self._loop.remove_reader(self._fd)
+        self._write(INHIBIT)
+
+    def _resume(self) -> None:
+        if not self.paused or self.batches.full():
+            return
+        self.paused = False
+        self._flush()
+        if not self.paused:
+            self._loop.add_reader(self._fd, self._read)
+            if self.enabled:
+                self._write(ENABLE)
+
+    def _setEnabled(self, enabled: bool) -> None:
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        # paused device stays inhibited, it's enabled on resume
+        if not self.paused:
+            self._write(ENABLE if enabled else INHIBIT)
+
+    def setEnabled(self, enabled: bool) -> None:
+        """
+        Enables or inhibits the device, e.g. when coins can or can't be inserted. Can be called from any thread
+        :param enabled: True to accept coins
+        :return: None
+        """
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._setEnabled, enabled)
+
+    def _notify(self) -> None:
+        with self._notifyLock:
+            if self._notified:
+                return
+            self._notified = True
+        if self.onBatch is not None:
+            self.onBatch()
+
+    def take(self) -> List[CoinBatch]:
+        """
+        Takes all queued batches, reading of device is resumed if it was paused. Called by consumer
+        :return: batches in order they were read
+        """
+        with self._notifyLock:
+            self._notified = False
+        batches = []
+        while True:
+            try:
+                batches.append(self.batches.get_nowait())
+            except queue.Empty:
+                break
+        if batches and self.paused:
+            self._loop.call_soon_threadsafe(self._resume)
+        return batches
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "events": self.decoder.events,
+            "repeats": self.decoder.repeats,
+            "lost": self.decoder.lost,
+            "noise": self.decoder.noise,
+            "pauses": self.pauses,
+            "refunded": self.refunded
+        }
+
+    def close(self) -> None:
+        """
+        Inhibits device and stops reader thread
+        :return: None
+        """
+        if self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._write, INHIBIT)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        os.close(self._fd)
+
+
+class CoinDeviceSimulator:
+    """
+    Coin device on a pseudo terminal. Acceptor opens path, simulator writes frames to the other end
+    """
+
+    def __init__(self, channels: Dict[int, Money] = DEFAULT_CHANNELS) -> None:
+        self.channels = channels
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.path = os.ttyname(self._slave)
+        self.counter = 0
+        self.inhibited = False
+        self.returned = 0
+
+    def channel(self, coin: Money) -> int:
+        """
+        :param coin: accepted coin
+        :return: its channel
+        """
+        for channel, channelCoin in self.channels.items():
+            if channelCoin == coin:
+                return channel
+        raise ValueError(f"Coin isn't accepted: {coin}")
+
+    def _readCommands(self) -> None:
+        try:
+            commands = os.read(self._master, 4096)
+        except BlockingIOError:
+            return
+        for command in commands.split(b"\n"):
+            if command == INHIBIT.strip():
+                self.inhibited = True
+            elif command == ENABLE.strip():
+                self.inhibited = False
+
+    def _frame(self, channel: int) -> bytes:
+        self.counter = self.counter % COUNTER_MAX + 1
+        return f"{self.counter}:{channel}\n".encode()
+
+    def insert(self, channels: List[int], repeats: int = 0) -> int:
+        """
+        Sends coins in one burst. Coins are returned to the customer while device is inhibited
+        :param channels: coin channels
+        :param repeats: how many times every frame is repeated
+        :return: number of accepted coins
+        """
+        self._readCommands()
+        if self.inhibited:
+            self.returned += len(channels)
+            return 0
+        frames = memoryview(b"".join(self._frame(channel) * (repeats + 1) for channel in channels))
+        while frames:
+            try:
+                frames = frames[os.write(self._master, frames):]
+            except BlockingIOError:  # host isn't reading, wait until line drains
+                select.select([], [self._master], [], 0.01)
+        return len(channels)
+
+    def noise(self, data: bytes) -> None:
+        os.write(self._master, data)
+
+    def close(self) -> None:
+        os.close(self._master)
+        os.close(self._slave)
+
+
+def simulate(rate: float, burst: int, repeats: int, currency: Optional[str], count: Optional[int]) -> Tuple[int, int]:
+    """
+    Inserts random coins until interrupted
+    :param rate: bursts per second
+    :param burst: maximal number of coins in one burst
+    :param repeats: repeated frames per coin
+    :param currency: only coins of this currency, all accepted coins if None
+    :param count: number of bursts, unlimited if None
+    :return: accepted and returned coins
+    """
+    simulator = CoinDeviceSimulator()
+    channels = [channel for channel, coin in simulator.channels.items() if currency in (None, coin.currency)]
+    print(f"coin device: {simulator.path}", flush=True)
+    accepted = 0
+    try:
+        while count is None or count > 0:
+            accepted += simulator.insert(random.choices(channels, k=random.randint(1, burst)), repeats)
+            count = None if count is None else count - 1
+            time.sleep(1 / rate)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.close()
+    return accepted, simulator.returned
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Coin device simulator on a pseudo terminal")
+    parser.add_argument("--rate", type=float, default=1.0, help="bursts per second")
+    parser.add_argument("--burst", type=int, default=1, help="maximal number of coins in one burst")
+    parser.add_argument("--repeats", type=int, default=0, help="repeated frames per coin")
+    parser.add_argument("--currency", choices=list(ACCEPTED_COINS), help="only coins of this currency")
+    parser.add_argument("--count", type=int, help="number of bursts, unlimited by default")
+    args = parser.parse_args()
+    accepted, returned = simulate(args.rate, args.burst, args.repeats, args.currency, args.count)
+    print(f"accepted {accepted}, returned {returned}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,355 @@
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .model import Account, Card, populateAccounts
+from .money import Money
+
+# accounts loaded at once by paging queries and account lists in GUI
+PAGE_SIZE = 100
+
+
+class AccountRepository:
+    """
+    Accounts and cards of the machine. Cards are looked up by account number,
+    accounts are listed page by page, so whole card base never has to be loaded.
+    Same card number always resolves to the same Card object, ledger relies on it
+    """
+
+    def findCard(self, accountNumber: str) -> Optional[Card]:
+        """
+        :param accountNumber: card account number
+        :return: card or None if there is no such card
+        """
+        raise NotImplementedError
+
+    def findAccount(self, accountNumber: str) -> Optional[Account]:
+        """
+        :param accountNumber: card account number
+        :return: account owning the card or None if there is no such card
+        """
+        raise NotImplementedError
+
+    def page(self, offset: int = 0, limit: int = PAGE_SIZE) -> List[Account]:
+        """
+        :param offset: number of accounts to skip
+        :param limit: maximal number of accounts
+        :return: accounts in insertion order
+        """
+        raise NotImplementedError
+
+    def bulkImport(self, accounts: Iterable[Account]) -> int:
+        """
+        Adds accounts with their cards
+        :param accounts: accounts
+        :return: number of imported cards
+        """
+        raise NotImplementedError
+
+    def updateBalances(self, cards: Iterable[Card]) -> None:
+        """
+        Persists current balances of given cards
+        :param cards: cards
+        :return: None
+        """
+
+    def balances(self) -> Dict[str, int]:
+        """
+        :return: balance of every card in minor units, by account number
+        """
+        return {card.accountNumber: card.balance.minor for account in self for card in account.cards}
+
+    def setBalances(self, balances: Dict[str, int]) -> None:
+        """
+        Sets and persists balances of given cards, unknown cards are skipped
+        :param balances: balances in minor units, by account number
+        :return: None
+        """
+        cards = []
+        for accountNumber, balance in balances.items():
+            card = self.findCard(accountNumber)
+            if card is not None:
+                card.balance = Money(balance, card.currency)
+                cards.append(card)
+        self.updateBalances(cards)
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def __iter__(self) -> Iterator[Account]:
+        offset = 0
+        while True:
+            accounts = self.page(offset, PAGE_SIZE)
+            yield from accounts
+            if len(accounts) < PAGE_SIZE:
+                return
+            offset += PAGE_SIZE
+
+    def close(self) -> None:
+        pass
+
+
+class InMemoryAccountRepository(AccountRepository):
+    """
+    Accounts kept in memory with hash index of cards by account number
+    """
+
+    def __init__(self, accounts: Optional[Iterable[Account]] = None) -> None:
+        self._accounts: List[Account] = []
+        self._cards: Dict[str, Card] = {}
+        self._owners: Dict[str, Account] = {}
+        self._lock = threading.Lock()
+        self.bulkImport(accounts if accounts is not None else populateAccounts())
+
+    def findCard(self, accountNumber: str) -> Optional[Card]:
+        return self._cards.get(accountNumber)
+
+    def findAccount(self, accountNumber: str) -> Optional[Account]:
+        return self._owners.get(accountNumber)
+
+    def page(self, offset: int = 0, limit: int = PAGE_SIZE) -> List[Account]:
+        return self._accounts[offset:offset + limit]
+
+    def bulkImport(self, accounts: Iterable[Account]) -> int:
+        imported = 0
+        with self._lock:
+            for account in accounts:
+                self._accounts.append(account)
+                for card in account.cards:
+                    self._cards[card.accountNumber] = card
+                    self._owners[card.accountNumber] = account
+                    imported += 1
+        return imported
+
+    def balances(self) -> Dict[str, int]:
+        return {accountNumber: card.balance.minor for accountNumber, card in list(self._cards.items())}
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def __iter__(self) -> Iterator[Account]:
+        return iter(self._accounts)
+
+
+class ConnectionPool:
+    """
+    Fixed size pool of SQLite connections shared between threads.
+    Connections are opened on demand, so idle pool costs nothing
+    """
+
+    def __init__(self, database: str, size: int = 4, uri: bool = False) -> None:
+        self.database = database
+        self.uri = uri
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        # statements are cached per connection, so repeated queries are prepared once
+        connection = sqlite3.connect(self.database, uri=self.uri, check_same_thread=False,
+                                     cached_statements=256, isolation_level=None)
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        with self._lock:
+            self._all.append(connection)
+        return connection
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrows connection, waits if all of them are in use
+        """
+        self._slots.acquire()
+        try:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self._open()
+            try:
+                yield connection
+            finally:
+                self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrows connection and runs statements in one transaction
+        """
+        with self.connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._all:
+                connection.close()
+            self._all.clear()
+
+
+class SqliteAccountRepository(AccountRepository):
+    """
+    Accounts stored in SQLite database. Balances are kept in minor units.
+    Accounts are loaded on first use and kept in identity map afterwards,
+    so the same card number always gives the same Card object
+    """
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS accounts (id INTEGER PRIMARY KEY, fullname TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS cards (number TEXT PRIMARY KEY, account INTEGER NOT NULL REFERENCES accounts(id),"
+        " balance INTEGER NOT NULL, currency TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS cards_account ON cards (account)"
+    ]
+
+    FIND_OWNER = "SELECT account FROM cards WHERE number = ?"
+    ACCOUNT = "SELECT fullname FROM accounts WHERE id = ?"
+    ACCOUNT_CARDS = "SELECT number, balance, currency FROM cards WHERE account = ? ORDER BY rowid"
+    PAGE = "SELECT id FROM accounts ORDER BY id LIMIT ? OFFSET ?"
+    COUNT = "SELECT COUNT(*) FROM accounts"
+    LAST_ID = "SELECT COALESCE(MAX(id), 0) FROM accounts"
+    INSERT_ACCOUNT = "INSERT INTO accounts (id, fullname) VALUES (?, ?)"
+    INSERT_CARD = "INSERT INTO cards (number, account, balance, currency) VALUES (?, ?, ?, ?)"
+    UPDATE_BALANCE = "UPDATE cards SET balance = ? WHERE number = ?"
+    BALANCES = "SELECT number, balance FROM cards"
+
+    def __init__(self, path: str = ":memory:", poolSize: int = 4) -> None:
+        if path == ":memory:":
+            # every connection to plain :memory: would see its own database
+            self.pool = ConnectionPool(f"file:accounts-{uuid.uuid4().hex}?mode=memory&cache=shared", poolSize, uri=True)
+            self._keeper = sqlite3.connect(self.pool.database, uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.pool = ConnectionPool(path, poolSize)
+            self._keeper = None
+            with self.pool.connection() as connection:
+                connection.execute("PRAGMA journal_mode = WAL")
+
+        with self.pool.transaction() as connection:
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+
+        self._accounts: Dict[int, Account] = {}
+        self._cards: Dict[str, Card] = {}
+        self._owners: Dict[str, Account] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, connection: sqlite3.Connection, accountId: int) -> Optional[Account]:
+        account = self._accounts.get(accountId)
+        if account is not None:
+            return account
+
+        row = connection.execute(self.ACCOUNT, (accountId,)).fetchone()
+        if row is None:
+            return None
+        cards = [Card(number, Money(balance, currency), currency)
+                 for number, balance, currency in connection.execute(self.ACCOUNT_CARDS, (accountId,))]
+        with self._lock:
+            # other thread could load it in the meantime
+            if accountId in self._accounts:
+                return self._accounts[accountId]
+            account = self._accounts[accountId] = Account(row[0], cards)
+            for card in cards:
+                self._cards[card.accountNumber] = card
+                self._owners[card.accountNumber] = account
+        return account
+
+    def findAccount(self, accountNumber: str) -> Optional[Account]:
+        account = self._owners.get(accountNumber)
+        if account is not None:
+            return account
+        with self.pool.connection() as connection:
+            row = connection.execute(self.FIND_OWNER, (accountNumber,)).fetchone()
+            return self._load(connection, row[0]) if row is not None else None
+
+    def findCard(self, accountNumber: str) -> Optional[Card]:
+        card = self._cards.get(accountNumber)
+        if card is not None:
+            return card
+        return self._cards.get(accountNumber) if self.findAccount(accountNumber) is not None else None
+
+    def page(self, offset: int = 0, limit: int = PAGE_SIZE) -> List[Account]:
+        with self.pool.connection() as connection:
+            ids = [row[0] for row in connection.execute(self.PAGE, (limit, offset))]
+            return [self._load(connection, accountId) for accountId in ids]
+
+    def bulkImport(self, accounts: Iterable[Account]) -> int:
+        with self.pool.transaction() as connection:
+            lastId = connection.execute(self.LAST_ID).fetchone()[0]
+            accountRows = []
+            cardRows = []
+            for accountId, account in enumerate(accounts, lastId + 1):
+                accountRows.append((accountId, account.fullname))
+                cardRows.extend((card.accountNumber, accountId, card.balance.minor, card.currency)
+                                for card in account.cards)
+            connection.executemany(self.INSERT_ACCOUNT, accountRows)
+            connection.executemany(self.INSERT_CARD, cardRows)
+        return len(cardRows)
+
+    def updateBalances(self, cards: Iterable[Card]) -> None:
+        rows = [(card.balance.minor, card.accountNumber) for card in cards]
+        if rows:
+            with self.pool.transaction() as connection:
+                connection.executemany(self.UPDATE_BALANCE, rows)
+
+    def balances(self) -> Dict[str, int]:
+        # read in bulk, only cards loaded already may have balances which aren't persisted yet
+        with self.pool.connection() as connection:
+            balances = dict(connection.execute(self.BALANCES))
+        balances.update((accountNumber, card.balance.minor) for accountNumber, card in list(self._cards.items()))
+        return balances
+
+    def setBalances(self, balances: Dict[str, int]) -> None:
+        # loaded cards are updated in place, others only in the database
+        with self.pool.transaction() as connection:
+            connection.executemany(self.UPDATE_BALANCE, [(balance, number) for number, balance in balances.items()])
+        for accountNumber, balance in balances.items():
+            card = self._cards.get(accountNumber)
+            if card is not None:
+                card.balance = Money(balance, card.currency)
+
+    def __len__(self) -> int:
+        with self.pool.connection() as connection:
+            return connection.execute(self.COUNT).fetchone()[0]
+
+    @classmethod
+    def copyOf(cls, path: str) -> "SqliteAccountRepository":
+        """
+        :param path: database path
+        :return: repository on in-memory copy of the database, changes aren't written back
+        """
+        repository = cls()
+        source = sqlite3.connect(path)
+        try:
+            with repository.pool.connection() as connection:
+                source.backup(connection)
+        finally:
+            source.close()
+        return repository
+
+    def close(self) -> None:
+        self.pool.close()
+        if self._keeper is not None:
+            self._keeper.close()
+
+
+def loadAccounts(dataDir: str, copy: bool = False) -> AccountRepository:
+    """
+    :param dataDir: machine data directory
+    :param copy: use in-memory copy of accounts database, so it isn't changed, e.g. by journal replay
+    :return: SQLite repository if data directory has accounts database, default accounts otherwise
+    """
+    path = os.path.join(dataDir, "accounts.db")
+    if os.path.exists(path):
+        return SqliteAccountRepository.copyOf(path) if copy else SqliteAccountRepository(path)
+    return InMemoryAccountRepository()
@@ -1,9 +1,15 @@
+import os
 import sys
 
 from PyQt5.QtWidgets import QApplication
 
+from package import DATA_DIR
+from package.accounts import loadAccounts
+from package.catalog import Catalog
 from package.controller import Controller
-from package.model import Core
+from package.journal import Journal, recover
+from package.metrics import METRICS, MetricsExporter
+from package.model import Core, Inventory, Machine
 from package.view import Window
 
 
@@ -11,6 +17,31 @@ def run():
     app = QApplication(sys.argv)
     view = Window()
     view.show()
-    model = Core()
-    Controller(view=view, model=model)
-    sys.exit(app.exec_())
+    machine = Machine(Inventory.load(os.path.join(DATA_DIR, "inventory.json")), loadAccounts(DATA_DIR),
+                      catalog=Catalog(path=os.path.join(DATA_DIR, "catalog.json")))
+    journalPath = os.path.join(DATA_DIR, "journal.jsonl")
+    recover(machine, journalPath)
+    machine.journal = Journal(journalPath, machine)
+    model = Core(machine=machine)
+    # VENDING_METRICS=1 enables metrics, VENDING_METRICS_PORT serves them over HTTP
+    exporter = None
+    if METRICS.enabled:
+        port = os.environ.get("VENDING_METRICS_PORT")
+        exporter = MetricsExporter(path=os.path.join(DATA_DIR, "metrics.prom"), port=int(port) if port else None)
+    # VENDING_COIN_DEVICE is serial device of coin acceptor, e.g. pseudo terminal of package.acceptor simulator
+    device = os.environ.get("VENDING_COIN_DEVICE")
+    acceptor = None
+    if device:
+        # serial device support is POSIX only, so it isn't imported unless needed
+        from package.acceptor import CoinAcceptor
+        acceptor = CoinAcceptor(device)
+    Controller(view=view, model=model, acceptor=acceptor)
+    exitCode = app.exec_()
+    if acceptor is not None:
+        acceptor.close()
+    machine.journal.close()
+    if exporter is not None:
+        exporter.close()
+    machine.ledger.close()
+    machine.accounts.close()
+    sys.exit(exitCode)
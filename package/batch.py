@@ -0,0 +1,116 @@
+"""
+Vectorized change computation for simulation and what-if analysis of denomination mixes.
+
+Every scenario is solved against the same inventory independently, nothing is taken out of the store.
+Requires NumPy, which isn't needed by the application itself:
+    $ pip install numpy
+"""
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # batch analysis only, the machine works without it
+    np = None
+
+from .change import BaseChangeSolver, OptimalChangeSolver
+from .model import BaseStore
+
+
+@dataclass
+class BatchChange:
+    """
+    Change of many scenarios
+    counts - coin counts, one row per scenario, one column per denomination (store order)
+    feasible - False where change can't be given
+    """
+    counts: "np.ndarray"
+    feasible: "np.ndarray"
+
+    @property
+    def coins(self) -> "np.ndarray":
+        """
+        :return: number of coins given in every scenario
+        """
+        return self.counts.sum(axis=1)
+
+    @property
+    def failureRate(self) -> float:
+        return float(1.0 - self.feasible.mean()) if len(self.feasible) else 0.0
+
+
+def _requireNumpy() -> None:
+    if np is None:
+        raise ImportError("Batch change computation requires numpy: pip install numpy")
+
+
+def batchChange(amounts: Sequence[int], values: Sequence[int], limits: Sequence[int],
+                exact: bool = True, solver: Optional[BaseChangeSolver] = None) -> BatchChange:
+    """
+    Calculates change of many amounts at once, with one NumPy pass per denomination from the largest one.
+
+    The pass is greedy with coin limits, which is what scalar solvers give for canonical coin systems
+    unless a limit is hit. Scenarios greedy can't pay, and those where some limit was hit, are handed to
+    the scalar solver, so results are the same as of Core.calculateChange. In non-canonical coin systems
+    (e.g. 1, 3, 4) greedy can give more coins than needed, so all scenarios are handed to the scalar solver
+    :param amounts: change to give in minor units, one per scenario
+    :param values: denomination values in minor units
+    :param limits: available amount of every denomination, or one row of limits per scenario
+    :param exact: hand scenarios greedy fails or hits a coin limit in (all scenarios if the coin system isn't
+    canonical) to scalar solver, otherwise greedy results are kept (not always fewest coins)
+    and scenarios greedy fails are reported infeasible
+    :param solver: scalar solver, OptimalChangeSolver by default
+    :return: coin counts and feasibility mask
+    """
+    _requireNumpy()
+    amounts = np.asarray(amounts, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    limits = np.broadcast_to(np.asarray(limits, dtype=np.int64), (len(amounts), len(values)))
+
+    counts = np.zeros((len(amounts), len(values)), dtype=np.int64)
+    remaining = np.where(amounts >= 0, amounts, 0)
+    # greedy isn't fewest coins anymore once a limit stops it from taking as many coins as fit
+    limited = np.zeros(len(amounts), dtype=bool)
+    for index in np.argsort(-values, kind="stable"):
+        if values[index] <= 0:
+            continue
+        fit = remaining // values[index]
+        taken = np.minimum(fit, limits[:, index])
+        limited |= taken < fit
+        counts[:, index] = taken
+        remaining -= taken * values[index]
+    feasible = (remaining == 0) & (amounts >= 0)
+
+    if exact:
+        solver = solver if solver is not None else OptimalChangeSolver()
+        valuesList = values.tolist()
+        unsure = ~feasible | limited
+        if not OptimalChangeSolver._isCanonical(tuple(sorted((value for value in valuesList if value > 0),
+                                                             reverse=True))):
+            unsure[:] = True
+        for row in np.flatnonzero(unsure & (amounts >= 0)):
+            solved = solver.solve(int(amounts[row]), valuesList, limits[row].tolist())
+            feasible[row] = solved is not None
+            if solved is not None:
+                counts[row] = solved
+    counts[~feasible] = 0
+    return BatchChange(counts, feasible)
+
+
+def storeChange(store: BaseStore, prices: Sequence[int], inserted: Sequence[int],
+                exact: bool = True, solver: Optional[BaseChangeSolver] = None) -> BatchChange:
+    """
+    Change of (price, amount inserted) scenarios for the current contents of a store
+    :param store: StorePLN, StoreUSD or StoreEUR
+    :param prices: product prices in minor units
+    :param inserted: inserted amounts in minor units
+    :param exact: see batchChange
+    :param solver: see batchChange
+    :return: coin counts in store denomination order and feasibility mask
+    """
+    _requireNumpy()
+    with store.lock:
+        values = [denomination.value.minor for denomination in store.denominations]
+        limits = [denomination.amount for denomination in store.denominations]
+    amounts = np.asarray(inserted, dtype=np.int64) - np.asarray(prices, dtype=np.int64)
+    return batchChange(amounts, values, limits, exact, solver)
@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .money import Money
+
+# Products offered by the machine and their positions in products grid
+ITEMS = [
+    {
+        "id": "kawa",
+        "position": (1, 1),
+        "name": "Kawa",
+        "image_url": "package/assets/products/kawa.jpg",
+        "price": Decimal("2.00")
+    },
+    {
+        "id": "herbata",
+        "position": (2, 1),
+        "name": "Herbata",
+        "image_url": "package/assets/products/tea.jpg",
+        "price": Decimal("2.00")
+    },
+    {
+        "id": "woda",
+        "position": (3, 1),
+        "name": "Woda",
+        "image_url": "package/assets/products/water.jpeg",
+        "price": Decimal("1.00")
+    },
+    {
+        "id": "snickers",
+        "position": (1, 2),
+        "name": "Snickers",
+        "image_url": "package/assets/products/snickers.jpeg",
+        "price": Decimal("4.00")
+    },
+    {
+        "id": "twix",
+        "position": (2, 2),
+        "name": "Twix",
+        "image_url": "package/assets/products/twix.png",
+        "price": Decimal("4.00")
+    },
+    {
+        "id": "kitkat",
+        "position": (3, 2),
+        "name": "Kitkat",
+        "image_url": "package/assets/products/kitkat.png",
+        "price": Decimal("4.00")
+    },
+    {
+        "id": "cola",
+        "position": (1, 3),
+        "name": "Cola",
+        "image_url": "package/assets/products/cola.jpeg",
+        "price": Decimal("5.00")
+    },
+    {
+        "id": "sok",
+        "position": (2, 3),
+        "name": "Sok",
+        "image_url": "package/assets/products/sok.jpg",
+        "price": Decimal("5.00")
+    },
+    {
+        "id": "czipsy",
+        "position": (3, 3),
+        "name": "Czipsy",
+        "image_url": "package/assets/products/lays.jpeg",
+        "price": Decimal("3.00")
+    }
+]
+
+
+@dataclass(frozen=True)
+class CatalogItem:
+    """
+    Product offered by the machine. Price is in PLN
+    """
+    id: str
+    name: str
+    price: Money
+    imageUrl: str
+    position: Tuple[int, int]
+
+    @classmethod
+    def fromDict(cls, item: Dict) -> "CatalogItem":
+        """
+        :param item: e.g. {"id": "kawa", "name": "Kawa", "price": "2.00", "image_url": "...", "position": [1, 1]}
+        :return: catalog item
+        """
+        return cls(str(item["id"]), item["name"], Money.of(Decimal(str(item["price"])), "PLN"),
+                   item["image_url"], tuple(item["position"]))
+
+
+@dataclass
+class CatalogChange:
+    """
+    Difference between two catalog versions, as lists of item ids
+    """
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.updated)
+
+
+class Catalog:
+    """
+    Products of the machine indexed by id. Can be loaded from JSON file
+    ({"products": [...]} with ITEMS-like entries) and reloaded when the file changes.
+    Reload replaces the index at once and reports what changed, so views can update only affected widgets
+    """
+
+    def __init__(self, items: Optional[List[Dict]] = None, path: Optional[str] = None) -> None:
+        self.path = path
+        self.version = 0
+        self.items: Dict[str, CatalogItem] = {}
+        self._names: Dict[str, CatalogItem] = {}
+        self._raw: Dict[str, Tuple] = {}
+        self._modified: Optional[float] = None
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.reloadIfModified()
+        else:
+            self.replace(items if items is not None else ITEMS)
+
+    def get(self, itemId: str) -> Optional[CatalogItem]:
+        return self.items.get(itemId)
+
+    def byName(self, name: str) -> Optional[CatalogItem]:
+        return self._names.get(name)
+
+    def __iter__(self) -> Iterator[CatalogItem]:
+        return iter(list(self.items.values()))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def replace(self, items: List[Dict]) -> CatalogChange:
+        """
+        Replaces all items
+        :param items: items as dicts
+        :return: change against previous items
+        """
+        with self._lock:
+            old = self.items
+            new = {}
+            raw = {}
+            change = CatalogChange()
+            for item in items:
+                itemId = str(item["id"])
+                key = (item["name"], str(item["price"]), item["image_url"], tuple(item["position"]))
+                raw[itemId] = key
+                # unchanged entries keep their item, so reload cost is mostly JSON parsing
+                if self._raw.get(itemId) == key:
+                    new[itemId] = old[itemId]
+                    continue
+                new[itemId] = CatalogItem.fromDict(item)
+                if itemId not in old:
+                    change.added.append(itemId)
+                elif old[itemId] != new[itemId]:
+                    change.updated.append(itemId)
+            change.removed = [itemId for itemId in old if itemId not in new]
+
+            self.items = new
+            self._raw = raw
+            self._names = {item.name: item for item in new.values()}
+            if change:
+                self.version += 1
+        return change
+
+    def reloadIfModified(self) -> CatalogChange:
+        """
+        Reloads items from catalog file if it was modified since last reload
+        :return: change, empty if file wasn't modified
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return CatalogChange()
+        modified = os.stat(self.path).st_mtime_ns
+        if modified == self._modified:
+            return CatalogChange()
+
+        with open(self.path, encoding="utf-8") as file:
+            data = json.load(file)
+        change = self.replace(data["products"])
+        self._modified = modified
+        return change
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        Writes catalog as JSON
+        :param path: file path, catalog path by default
+        :return: None
+        """
+        products = [{"id": item.id, "name": item.name, "price": str(item.price), "image_url": item.imageUrl,
+                     "position": list(item.position)} for item in self]
+        with open(path or self.path, "w", encoding="utf-8") as file:
+            json.dump({"products": products}, file, indent=2, ensure_ascii=False)
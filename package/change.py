@@ -0,0 +1,500 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+def addCoins(row: int, value: int, limit: int, mask: int) -> int:
+    """
+    Adds coins to bitset of payable amounts. Coins are added in binary split pieces (1, 2, 4, ...),
+    so it takes log(limit) big integer shifts
+    :param row: bitset, bit x is set if amount x can be paid
+    :param value: coin value in minor units
+    :param limit: number of coins
+    :param mask: bits of amounts which are tracked
+    :return: bitset of amounts payable with given coins added
+    """
+    remaining, piece = limit, 1
+    while remaining > 0:
+        piece = min(piece, remaining)
+        row |= (row << (value * piece)) & mask
+        remaining -= piece
+        piece *= 2
+    return row
+
+
+class BaseChangeSolver:
+    """
+    Abstract change solver
+
+    Solvers work on plain integers: the amount to give back and the
+    denomination values are in minor units, limits are coin counts in store.
+    """
+
+    def solve(self, amount: int, values: Sequence[int], limits: Sequence[int]) -> Optional[List[int]]:
+        """
+        Calculates how many coins of every denomination should be given
+        :param amount: change to give in minor units
+        :param values: denomination values in minor units
+        :param limits: available amount of every denomination
+        :return: number of coins per denomination (same order as values) or None if change can't be given
+        """
+        raise NotImplementedError
+
+    def cacheKey(self, amount: int, values: Sequence[int], limits: Sequence[int]) -> Hashable:
+        """
+        Part of the store solution depends on. Solver never gives more than amount // value coins
+        of a denomination, so limits above that don't change the solution
+        :return: key of solution in ChangeCache
+        """
+        return tuple(min(limit, amount // value) if value > 0 else 0 for value, limit in zip(values, limits))
+
+
+class GreedyChangeSolver(BaseChangeSolver):
+    """
+    Largest denomination first. Fast, but may fail (or use more coins than needed)
+    when coin limits are reached
+    """
+
+    def solve(self, amount: int, values: Sequence[int], limits: Sequence[int]) -> Optional[List[int]]:
+        if amount < 0:
+            return None
+
+        counts = [0] * len(values)
+        for index in sorted(range(len(values)), key=lambda i: -values[i]):
+            if amount == 0:
+                break
+            count = min(amount // values[index], limits[index])
+            counts[index] = count
+            amount -= count * values[index]
+
+        return counts if amount == 0 else None
+
+
+class OptimalChangeSolver(BaseChangeSolver):
+    """
+    Bounded coin change solver which returns the fewest-coins solution
+    respecting coin limits.
+
+    For canonical coin systems greedy answer is returned right away if it doesn't
+    run into coin limits. Otherwise a bounded knapsack table is built for every suffix of denominations
+    (sorted from the largest one). Rows are stored as bitsets of payable amounts, so
+    a row is built with a few big integer shifts instead of a loop over every amount.
+    Then denominations are explored from the largest count first, visiting only
+    payable remainders and cutting branches which can't beat the best solution so far.
+    The first solution found is the greedy one, so the search stays small.
+    """
+
+    def solve(self, amount: int, values: Sequence[int], limits: Sequence[int]) -> Optional[List[int]]:
+        if amount < 0:
+            return None
+        size = len(values)
+        if amount == 0:
+            return [0] * size
+
+        order = [i for i in sorted(range(size), key=lambda i: -values[i]) if limits[i] > 0 and values[i] > 0]
+        orderedValues = [values[i] for i in order]
+        orderedLimits = [min(limits[i], amount // values[i]) for i in order]
+        count = len(order)
+
+        def lowerBound(i: int, rest: int) -> int:
+            """
+            Fewest coins needed to pay rest with denominations i..n when coins could be split
+            """
+            coins = 0
+            for j in range(i, count):
+                if rest <= 0:
+                    break
+                taken = min(orderedLimits[j], rest // orderedValues[j])
+                coins += taken
+                rest -= taken * orderedValues[j]
+                if rest and taken < orderedLimits[j]:
+                    return coins + 1
+            return coins
+
+        # in canonical coin systems (like PLN, USD and EUR) greedy solution is the optimal one
+        # if no coin limit was reached on the way
+        if self._isCanonical(tuple(orderedValues)):
+            greedy = []
+            rest = amount
+            for value, limit in zip(orderedValues, orderedLimits):
+                number = rest // value
+                if number > limit:
+                    break
+                greedy.append(number)
+                rest -= number * value
+            if rest == 0:
+                return self._unorder(greedy + [0] * (count - len(greedy)), order, size)
+
+        # payable[i] - bitset of amounts which can be paid with denominations i..n
+        mask = (1 << (amount + 1)) - 1
+        payable = [0] * count + [1]
+        for i in range(count - 1, -1, -1):
+            payable[i] = addCoins(payable[i + 1], orderedValues[i], orderedLimits[i], mask)
+        if not (payable[0] >> amount) & 1:
+            return None
+
+        # bit tests on bytes are O(1), unlike shifting a big integer
+        payable = [row.to_bytes((amount >> 3) + 1, "little") for row in payable]
+        counts = [0] * count
+        best = [None, amount + 1]  # best counts, number of coins
+
+        def search(i: int, remaining: int, used: int) -> None:
+            if remaining == 0:
+                if used < best[1]:
+                    best[0] = counts[:]
+                    best[1] = used
+                return
+
+            value = orderedValues[i]
+            nextPayable = payable[i + 1]
+            for number in range(min(orderedLimits[i], remaining // value), -1, -1):
+                rest = remaining - number * value
+                if not (nextPayable[rest >> 3] >> (rest & 7)) & 1:
+                    continue
+                # lower bound of coins for this branch; grows when number decreases
+                if used + number + lowerBound(i + 1, rest) >= best[1]:
+                    break
+                counts[i] = number
+                search(i + 1, rest, used + number)
+            counts[i] = 0
+
+        search(0, amount, 0)
+        return self._unorder(best[0], order, size)
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _isCanonical(values: Tuple[int, ...]) -> bool:
+        """
+        Checks if greedy algorithm gives fewest coins for every amount when coins are unlimited.
+        Counterexample, if any, is smaller than sum of two largest denominations (Kozen, Zaks)
+        :param values: denomination values sorted from the largest one
+        :return: True if coin system is canonical
+        """
+        if len(values) < 3:
+            return True
+        limit = values[0] + values[1]
+        fewest = [0] + [limit] * limit
+        for amount in range(1, limit):
+            fewest[amount] = min((fewest[amount - value] + 1 for value in values if value <= amount), default=limit)
+            greedy, rest = 0, amount
+            for value in values:
+                greedy += rest // value
+                rest %= value
+            if fewest[amount] < limit and (rest or greedy > fewest[amount]):
+                return False
+        return True
+
+    @staticmethod
+    def _unorder(counts: List[int], order: List[int], size: int) -> List[int]:
+        """
+        Maps counts of sorted denominations back to the given order
+        """
+        result = [0] * size
+        for position, index in enumerate(order):
+            result[index] = counts[position]
+        return result
+
+
+class PolicyChangeSolver(BaseChangeSolver):
+    """
+    Change policy on top of the fewest-coins solver. Policy gives coin limits it prefers to use,
+    in order of preference, e.g. only coins above target level. The first of them change can be given with
+    is used, unless it takes more than maxExtraCoins coins over the fewest-coins solution.
+    Otherwise the fewest-coins solution with all coins is given, so policy never makes change fail
+    """
+
+    def __init__(self, maxExtraCoins: int = 2) -> None:
+        self.maxExtraCoins = maxExtraCoins
+        self.solver = OptimalChangeSolver()
+
+    def preferredLimits(self, values: Sequence[int], limits: Sequence[int]) -> List[List[int]]:
+        """
+        :param values: denomination values in minor units
+        :param limits: available amount of every denomination
+        :return: coin limits to try, the most preferred first
+        """
+        raise NotImplementedError
+
+    def solve(self, amount: int, values: Sequence[int], limits: Sequence[int]) -> Optional[List[int]]:
+        fewest = self.solver.solve(amount, values, limits)
+        if fewest is None:
+            return None
+        allowed = sum(fewest) + self.maxExtraCoins
+        for preferred in self.preferredLimits(values, limits):
+            counts = self.solver.solve(amount, values, preferred)
+            if counts is not None and sum(counts) <= allowed:
+                return counts
+        return fewest
+
+    def cacheKey(self, amount: int, values: Sequence[int], limits: Sequence[int]) -> Hashable:
+        return tuple(self.solver.cacheKey(amount, values, preferred)
+                     for preferred in [limits] + self.preferredLimits(values, limits))
+
+
+class BalancedChangeSolver(PolicyChangeSolver):
+    """
+    Keeps coin levels close to targets: change is given from coins above target level first,
+    then from coins above half of it
+    """
+
+    def __init__(self, targets: Optional[Dict[int, int]] = None, defaultTarget: int = 10,
+                 maxExtraCoins: int = 2) -> None:
+        """
+        :param targets: target number of coins per denomination value in minor units
+        :param defaultTarget: target of denominations missing in targets
+        :param maxExtraCoins: see PolicyChangeSolver
+        """
+        super().__init__(maxExtraCoins)
+        self.targets = targets if targets is not None else {}
+        self.defaultTarget = defaultTarget
+
+    def preferredLimits(self, values: Sequence[int], limits: Sequence[int]) -> List[List[int]]:
+        targets = [self.targets.get(value, self.defaultTarget) for value in values]
+        return [[max(0, limit - target) for limit, target in zip(limits, targets)],
+                [max(0, limit - target // 2) for limit, target in zip(limits, targets)]]
+
+
+class PreserveScarceChangeSolver(PolicyChangeSolver):
+    """
+    Doesn't give denominations with fewer than scarceBelow coins left, unless change can't be given otherwise
+    """
+
+    def __init__(self, scarceBelow: int = 5, maxExtraCoins: int = 2) -> None:
+        super().__init__(maxExtraCoins)
+        self.scarceBelow = scarceBelow
+
+    def preferredLimits(self, values: Sequence[int], limits: Sequence[int]) -> List[List[int]]:
+        return [[limit if limit >= self.scarceBelow else 0 for limit in limits]]
+
+
+class CrossCurrencyChangeSolver:
+    """
+    Pays change partly with coins of another currency, when store of the product currency can't pay it alone.
+
+    As much as possible is paid in the product currency: payable amounts of both stores are built as bitsets
+    and only amounts payable in the product currency are tried, from the largest one.
+    Then both parts are solved with given solver
+    """
+
+    def __init__(self, solver: Optional[BaseChangeSolver] = None) -> None:
+        self.solver = solver if solver is not None else OptimalChangeSolver()
+
+    @staticmethod
+    def _payable(amount: int, values: Sequence[int], limits: Sequence[int]) -> int:
+        mask = (1 << (amount + 1)) - 1
+        row = 1
+        for value, limit in zip(values, limits):
+            if value > 0:
+                row = addCoins(row, value, min(limit, amount // value), mask)
+        return row
+
+    def split(self, amount: int, values: Sequence[int], limits: Sequence[int],
+              otherValues: Sequence[int], otherLimits: Sequence[int],
+              convert: Callable[[int], int]) -> Optional[Tuple[int, int]]:
+        """
+        :param amount: change to give in minor units of the product currency
+        :param values: denomination values of the product currency store
+        :param limits: available amount of every denomination of the product currency store
+        :param otherValues: denomination values of the other store
+        :param otherLimits: available amount of every denomination of the other store
+        :param convert: converts amount in minor units of the product currency to minor units of the other one
+        :return: part paid in product currency and part paid in the other one, None if change can't be given
+        """
+        if amount < 0:
+            return None
+        payable = self._payable(amount, values, limits)
+        otherPayable = self._payable(convert(amount), otherValues, otherLimits)
+        return self.splitPayable(amount, payable, otherPayable, convert)
+
+    @staticmethod
+    def splitPayable(amount: int, payable: int, otherPayable: int,
+                     convert: Callable[[int], int]) -> Optional[Tuple[int, int]]:
+        """
+        Same as split, for already known payable amounts, e.g. from ReachabilityIndex
+        :param amount: change to give in minor units of the product currency
+        :param payable: bitset of amounts payable in the product currency, at least up to amount
+        :param otherPayable: bitset of amounts payable in the other currency, at least up to convert(amount)
+        :param convert: see split
+        :return: see split
+        """
+        payable &= (1 << (amount + 1)) - 1
+        while payable:
+            part = payable.bit_length() - 1
+            other = convert(amount - part)
+            if (otherPayable >> other) & 1:
+                return part, other
+            payable ^= 1 << part
+        return None
+
+    def solve(self, amount: int, values: Sequence[int], limits: Sequence[int],
+              otherValues: Sequence[int], otherLimits: Sequence[int],
+              convert: Callable[[int], int]) -> Optional[Tuple[List[int], List[int]]]:
+        """
+        Parameters are the same as of split
+        :return: numbers of coins of both stores or None if change can't be given
+        """
+        parts = self.split(amount, values, limits, otherValues, otherLimits, convert)
+        if parts is None:
+            return None
+        return self.solver.solve(parts[0], values, limits), self.solver.solve(parts[1], otherValues, otherLimits)
+
+
+# change policies by name, see createChangeSolver
+CHANGE_POLICIES = {
+    "fewest": OptimalChangeSolver,
+    "balanced": BalancedChangeSolver,
+    "preserve-scarce": PreserveScarceChangeSolver
+}
+
+
+def createChangeSolver(policy: str) -> BaseChangeSolver:
+    """
+    :param policy: 'fewest', 'balanced' or 'preserve-scarce'
+    :return: change solver of given policy with default settings
+    """
+    if policy not in CHANGE_POLICIES:
+        raise ValueError(f"Unknown change policy: {policy}")
+    return CHANGE_POLICIES[policy]()
+
+
+class ReachabilityIndex:
+    """
+    Change amounts, up to a ceiling, which can be paid with coins of one store.
+
+    Bitset of payable amounts is kept for every prefix of denominations. Added coins are shifted into rows
+    of the prefixes which contain their denomination, taken coins make rows from that denomination on rebuilt.
+    Either way it's a few big integer shifts of ceiling bits per row. Coins above ceiling // value
+    can't be used for any tracked amount, so their changes don't touch the index.
+    Last row is kept as bytes too, so a query is a single bit test
+    """
+
+    def __init__(self, values: Sequence[int], ceiling: int) -> None:
+        self.values = list(values)
+        self.ceiling = ceiling
+        self._caps = [ceiling // value if value > 0 else 0 for value in self.values]
+        self._mask = (1 << (ceiling + 1)) - 1
+        self._limits = [0] * len(self.values)
+        self._rows = [1] * (len(self.values) + 1)
+        self._bits = self._toBytes(1)
+        # rows rebuilt after coins were taken
+        self.rebuilds = 0
+        # version of the store index reflects, kept by the owner
+        self.version: Optional[int] = None
+
+    def _toBytes(self, row: int) -> bytes:
+        return row.to_bytes((self.ceiling >> 3) + 1, "little")
+
+    def update(self, limits: Sequence[int]) -> None:
+        """
+        Updates rows of denominations whose usable amount changed
+        :param limits: available amount of every denomination
+        :return: None
+        """
+        size = len(self.values)
+        added = []
+        first = size
+        for i, (cap, limit) in enumerate(zip(self._caps, limits)):
+            usable = limit if limit < cap else cap
+            old = self._limits[i]
+            if usable > old:
+                added.append((i, usable - old))
+            elif usable < old and i < first:
+                first = i
+            self._limits[i] = usable
+        if not added and first == size:
+            return
+
+        rows = self._rows
+        # rows after first are rebuilt anyway
+        for i, count in added:
+            for j in range(i + 1, first + 1):
+                rows[j] = addCoins(rows[j], self.values[i], count, self._mask)
+        for i in range(first, size):
+            rows[i + 1] = addCoins(rows[i], self.values[i], self._limits[i], self._mask)
+            self.rebuilds += 1
+        self._bits = self._toBytes(rows[-1])
+
+    @property
+    def payable(self) -> int:
+        """
+        :return: bitset of payable amounts up to ceiling, bit x is set if amount x can be paid
+        """
+        return self._rows[-1]
+
+    def canPay(self, amount: int) -> Optional[bool]:
+        """
+        :param amount: change in minor units
+        :return: whether change can be given, None if amount is above ceiling and isn't tracked
+        """
+        if amount < 0:
+            return False
+        if amount > self.ceiling:
+            return None
+        return bool((self._bits[amount >> 3] >> (amount & 7)) & 1)
+
+
+# returned by ChangeCache.get when there is no entry
+MISSING = object()
+
+
+class ChangeCache:
+    """
+    Bounded LRU cache of change solutions shared by all sessions of a machine.
+
+    Solutions are keyed by currency, amount and solver cache key of the store. Store version can't be used
+    directly: every inserted coin increases it, so no purchase would ever hit the cache. Solver cache key changes
+    exactly when coins the solver may use change, so entries of an older inventory are simply never hit again
+    and fall out of the cache
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: object = MISSING) -> object:
+        """
+        :param key: solution key
+        :param default: returned if there is no entry
+        :return: cached solution, None is a valid cached solution of change which can't be given
+        """
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: object) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hitRate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        :return: hits, misses, evictions, hit rate and number of entries
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hitRate": self.hitRate, "size": len(self._entries)}
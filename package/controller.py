@@ -1,26 +1,55 @@
+import os
+import time
 from decimal import Decimal
 from functools import partial
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 
-from .model import Product, Core
+from PyQt5.QtCore import QFileSystemWatcher, QObject, Qt, pyqtSignal
+
+from .engine import Result, State, TransactionEngine
+from .metrics import METRICS
+from .model import Core, SOLD_OUT_ERROR
+from .money import Money
 from .view import Window
 
+if TYPE_CHECKING:
+    # POSIX only, imported by the app when a coin device is configured
+    from .acceptor import CoinAcceptor
+
+# shown during cash payment when machine may not be able to give change
+EXACT_CHANGE_WARNING = "Tylko odliczona kwota!"
+# shown during cash payment with coins from coin acceptor which weren't in selected currency
+REFUND_MESSAGE = "Zwrot monet:"
+
 
 class Controller:
     """
     Base controller of vending-machine
     """
 
-    def __init__(self, view: Window, model: Core) -> None:
+    def __init__(self, view: Window, model: Core, acceptor: Optional["CoinAcceptor"] = None) -> None:
         self.model = model
         self.view = view
+        self.engine = TransactionEngine(model)
+        self.menuControllers: Dict[str, object] = {}
+        self.acceptorController = None
 
-        # controller components
+        # controller components, menu controllers are bound when their menu is created
         ProductMenuController(self)
-        CurrencyMenuController(self)
-        PaymentTypeMenuController(self)
-        CashPaymentMenuController(self)
-        CashResultMenuController(self)
-        CardPaymentMenuController(self)
+        menuControllers = {
+            "currency": CurrencyMenuController,
+            "paymentType": PaymentTypeMenuController,
+            "cash": CashPaymentMenuController,
+            "cashResult": CashResultMenuController,
+            "card": CardPaymentMenuController
+        }
+        for name, menuController in menuControllers.items():
+            view.displayMenu.onMenuCreated(name, partial(self._bindMenu, name, menuController))
+        if acceptor is not None:
+            self.acceptorController = CoinAcceptorController(self, acceptor)
+
+    def _bindMenu(self, name: str, menuController: type) -> None:
+        self.menuControllers[name] = menuController(self)
 
 
 class ProductMenuController:
@@ -30,6 +59,9 @@ class ProductMenuController:
 
     def __init__(self, controller: Controller) -> None:
         self.controller = controller
+        self.catalog = controller.model.machine.catalog
+        self.stock = controller.model.machine.stock
+        self.watcher = None
         self.listenSignal()
 
     def _setMessage(self, name: str) -> None:
@@ -42,27 +74,75 @@ class ProductMenuController:
                   f"Poproszę wybrać wałutę"
         self.controller.view.setDisplayText(message)
 
-    def _performAction(self, name: str, price: Decimal) -> None:
+    def _performAction(self, name: str, price: Money, position: Tuple[int, int]) -> None:
         """
-        Create product instance and make UI changes. Default currency 'PLN'
+        Select product and make UI changes. Default currency 'PLN'
         :param name: product name
         :param price: product price.
+        :param position: product slot
+        :return: None
+        """
+        with METRICS.timer("ui_select_product"):
+            result = self.controller.engine.selectProduct(name, price, position)
+            if not result.ok:
+                self.controller.view.setDisplayText(result.error)
+                return
+            self._setMessage(name)
+            self.controller.view.setButtonsEnabled(False)  # Disable buttons
+            self.controller.view.switchMenu(result.state.value)  # switch to Currency menu
+
+    def _onProductClicked(self, itemId: str) -> None:
+        """
+        Selects product with current catalog price
+        :param itemId: catalog item id
         :return: None
         """
+        item = self.catalog.get(itemId)
+        # click could be queued before buttons were disabled
+        if item is None or self.controller.engine.state is not State.IDLE:
+            return
+        # button may be clicked before its sold out state is applied
+        if self.stock.isSoldOut(item.position):
+            self.controller.view.setDisplayText(SOLD_OUT_ERROR)
+            return
+        self._performAction(item.name, item.price, item.position)
 
-        self.controller.model.selectedProduct = Product(name, price)
-        self._setMessage(name)
-        self.controller.view.setButtonsEnabled(False)  # Disable buttons
-        self.controller.view.switchMenu("currency")  # switch to Currency menu
+    def _connectButtons(self, buttons) -> None:
+        for button in buttons:
+            button.clicked.connect(partial(self._onProductClicked, button.itemId))
+
+    def _reloadCatalog(self) -> None:
+        """
+        Reloads catalog file and updates only changed buttons
+        :return: None
+        """
+        try:
+            change = self.catalog.reloadIfModified()
+        except (OSError, ValueError, KeyError):
+            # file is being written, next change notification will retry
+            return
+        finally:
+            # file replaced by rename isn't watched anymore
+            if os.path.exists(self.catalog.path) and self.catalog.path not in self.watcher.files():
+                self.watcher.addPath(self.catalog.path)
+        if change:
+            self._connectButtons(self.controller.view.productsMenu.applyChange(self.catalog, change))
 
     def listenSignal(self) -> None:
         """
-        Listen fro product selection
+        Listen fro product selection and catalog file changes
         :return: None
         """
-        for button in self.controller.view.productsMenu.productButtons:
-            button.clicked.connect(
-                partial(self._performAction, button.product.name, button.product.price))
+        self._connectButtons(self.controller.view.productsMenu.showCatalog(self.catalog))
+        self.controller.view.setSoldOut(self.stock.soldOut)
+        self.stock.listeners.append(self.controller.view.setSoldOut)
+
+        if self.catalog.path is not None:
+            directory = os.path.dirname(os.path.abspath(self.catalog.path))
+            self.watcher = QFileSystemWatcher([path for path in (self.catalog.path, directory)
+                                               if os.path.exists(path)])
+            self.watcher.fileChanged.connect(partial(self._reloadCatalog))
+            self.watcher.directoryChanged.connect(partial(self._reloadCatalog))
 
 
 class CurrencyMenuController:
@@ -89,12 +169,10 @@ class CurrencyMenuController:
         :param currency: 'USD', 'PLN' or 'EUR'
         :return: None
         """
-        if self.controller.model.selectedProduct is None:
-            raise Exception("Product not initialized")
-
-        self.controller.model.selectedProduct.convertCurrency(currency)
-        self._setMessage()
-        self.controller.view.switchMenu("paymentType")  # switch to PaymentType menu
+        with METRICS.timer("ui_choose_currency"):
+            result = self.controller.engine.chooseCurrency(currency)
+            self._setMessage()
+            self.controller.view.switchMenu(result.state.value)  # switch to PaymentType menu
 
     def listenSignal(self) -> None:
         """
@@ -118,14 +196,17 @@ class PaymentTypeMenuController:
         self.controller = controller
         self.listenSignal()
 
-    def _setMessage(self) -> None:
+    def _setMessage(self, result: Result) -> None:
         """
         Updates display with prepayment information
+        :param result: payment type selection result
         :return:
         """
         message = f"Wybrana wałuta: {self.controller.model.selectedProduct.currency}\n" \
                   f"Cena produktu: {self.controller.model.selectedProduct.price}\n" \
                   f"Wplacona suma: {self.controller.model.enteredAmount}"
+        if result.exactChangeOnly:
+            message += f"\n{EXACT_CHANGE_WARNING}"
         self.controller.view.setDisplayText(message)
 
     def _performAction(self, paymentType: str) -> None:
@@ -134,14 +215,12 @@ class PaymentTypeMenuController:
         :param paymentType: Cash or Card
         :return: None
         """
-        self._setMessage()
-        if paymentType == "cash":
-            self.controller.view.displayMenu.cashPaymentMenu.setCurrencyButtons(self.controller.model.selectedProduct.currency)
-            self.controller.view.switchMenu("cash")  # switch to Cash menu
-        elif paymentType == "card":
-            self.controller.view.switchMenu("card")  # switch to Card menu
-        else:
-            raise Exception(f"Invalid payment type given: {paymentType}")
+        with METRICS.timer("ui_choose_payment_type"):
+            result = self.controller.engine.choosePaymentType(paymentType)
+            self._setMessage(result)
+            if paymentType == "cash":
+                self.controller.view.displayMenu.cashPaymentMenu.setCurrencyButtons(result.product.currency)
+            self.controller.view.switchMenu(result.state.value)  # switch to Cash or Card menu
 
     def listenSignal(self) -> None:
         """
@@ -163,15 +242,22 @@ class CashPaymentMenuController:
         self.controller = controller
         self.listenSignal()
 
-    def _updateMessage(self) -> None:
+    def _updateMessage(self, result: Result, refunded: Optional[List[Money]] = None) -> None:
         """
         Updates display information after certain actions
+        :param result: coin insertion or payment result
+        :param refunded: coins paid back to the customer
         :return: None
         """
         message = f"Wybrana wałuta: {self.controller.model.selectedProduct.currency}\n" \
                   f"Cena produktu: {self.controller.model.selectedProduct.price}\n" \
                   f"Wplacona suma: {self.controller.model.enteredAmount}\n" \
                   f"{self.controller.model.error if self.controller.model.error else ''}"
+        if result.exactChangeOnly:
+            message += f"\n{EXACT_CHANGE_WARNING}" if self.controller.model.error else EXACT_CHANGE_WARNING
+        if refunded:
+            refund = f"{REFUND_MESSAGE} {', '.join(f'{coin} {coin.currency}' for coin in refunded)}"
+            message += refund if message.endswith("\n") else f"\n{refund}"
         self.controller.view.setDisplayText(message)
 
     def _setMessage(self) -> None:
@@ -190,32 +276,45 @@ class CashPaymentMenuController:
         :param buttonName: name of button
         :return: None
         """
-        cashMenu = self.controller.view.displayMenu.cashPaymentMenu
-        values = {
-            "btn1": cashMenu.buttonCash1.text(),
-            "btn2": cashMenu.buttonCash2.text(),
-            "btn3": cashMenu.buttonCash3.text(),
-            "btn4": cashMenu.buttonCash4.text()
-        }
-        self.controller.model.insertDenomination(Decimal(values[buttonName]))
-        self._updateMessage()
+        with METRICS.timer("ui_insert_coin"):
+            cashMenu = self.controller.view.displayMenu.cashPaymentMenu
+            values = {
+                "btn1": cashMenu.buttonCash1.text(),
+                "btn2": cashMenu.buttonCash2.text(),
+                "btn3": cashMenu.buttonCash3.text(),
+                "btn4": cashMenu.buttonCash4.text()
+            }
+            result = self.controller.engine.insertCoin(Decimal(values[buttonName]))
+            self._updateMessage(result)
+
+    def insertCoins(self, coins: List[Money], refunded: List[Money]) -> None:
+        """
+        Inserts coins read by coin acceptor
+        :param coins: coins in selected product currency
+        :param refunded: coins in other currencies, already paid back
+        :return: None
+        """
+        engine = self.controller.engine
+        result = engine.insertCoins(coins) if coins else engine.result()
+        self._updateMessage(result, refunded)
 
     def _processPayment(self) -> None:
         """
         After submitting payment, perform processing
         :return: None
         """
-        self.controller.model.processCashPayment()
+        with METRICS.timer("ui_cash_payment"):
+            result = self.controller.engine.pay()
 
-        # if error occurred, then display it
-        if self.controller.model.error is not None:
-            self._updateMessage()
-        # if change exists, then show post payment page
-        elif self.controller.model.change is not None:
-            self._setMessage()
-            self.controller.view.switchMenu("cashResult")  # switch to Card menu
-        else:
-            raise Exception("Change attribute doesn't set")
+            # if error occurred, then display it
+            if not result.ok:
+                self._updateMessage(result)
+            # if change exists, then show post payment page
+            elif result.change is not None:
+                self._setMessage()
+                self.controller.view.switchMenu(result.state.value)  # switch to CashResult menu
+            else:
+                raise Exception("Change attribute doesn't set")
 
     def listenSignal(self) -> None:
         """
@@ -235,6 +334,59 @@ class CashPaymentMenuController:
         )
 
 
+class CoinSignal(QObject):
+    batchReady = pyqtSignal()
+
+
+class CoinAcceptorController:
+    """
+    Coin acceptor controller. Acceptor notifies it from its reader thread, batches are taken and
+    applied on the Qt thread, so the display is updated once per batch however fast coins come.
+    Device is enabled only during cash payment
+    """
+
+    def __init__(self, controller: Controller, acceptor: "CoinAcceptor") -> None:
+        self.controller = controller
+        self.acceptor = acceptor
+        self.signal = CoinSignal()
+        self.signal.batchReady.connect(self._applyBatches, Qt.QueuedConnection)
+        acceptor.onBatch = self.signal.batchReady.emit
+        controller.engine.listeners.append(self._onStateChanged)
+        self._onStateChanged(controller.engine.state)
+
+    def _onStateChanged(self, state: State) -> None:
+        """
+        Enables the device on entering cash payment and inhibits it on leaving
+        :param state: new transaction state
+        :return: None
+        """
+        self.acceptor.setEnabled(state is State.CASH)
+
+    def _applyBatches(self) -> None:
+        """
+        Inserts queued coins. Device can accept coins before it reads inhibit command, so coins which
+        arrive outside cash payment or aren't in product currency are refunded: the machine pays them back
+        in the same denominations and records the refund in the journal
+        :return: None
+        """
+        with METRICS.timer("ui_insert_coins"):
+            batches = self.acceptor.take()
+            coins = [coin for batch in batches for coin in batch.coins]
+            engine = self.controller.engine
+            currency = self.controller.model.selectedProduct.currency if engine.state == State.CASH else None
+            accepted = [coin for coin in coins if coin.currency == currency]
+            refunded = [coin for coin in coins if coin.currency != currency]
+            if refunded:
+                engine.refundCoins(refunded)
+                self.acceptor.refunded += len(refunded)
+                METRICS.increment("coin_refunds", len(refunded))
+            if currency is not None:
+                self.controller.menuControllers["cash"].insertCoins(accepted, refunded)
+        now = time.perf_counter()
+        for batch in batches:
+            METRICS.observe("coin_ingest", now - batch.received)
+
+
 class CashResultMenuController:
     """
     Post payment cash result menu controller
@@ -249,16 +401,14 @@ class CashResultMenuController:
         Shows change table dialog
         :return: None
         """
-        changeTableValues = self.controller.model.change
-        self.controller.view.updateChangeTable(changeTableValues)
+        self.controller.view.updateChangeTable(self.controller.model.changeDenominations)
 
     def _showDenominationsDialog(self) -> None:
         """
         Shows table dialog with available denominations
         :return: None
         """
-        denominationsTableValues = self.controller.model.changeToTable(self.controller.model.store.denominations)
-        self.controller.view.updateDenominationsTable(denominationsTableValues)
+        self.controller.view.updateDenominationsTable(self.controller.model.store.denominations)
 
     def _reset(self) -> None:
         """
@@ -266,7 +416,7 @@ class CashResultMenuController:
         :return: None
         """
         self.controller.view.resetUI()
-        self.controller.model.reset()
+        self.controller.engine.reset()
 
     def listenSignal(self) -> None:
         """
@@ -288,9 +438,10 @@ class CardPaymentMenuController:
 
     def __init__(self, controller: Controller) -> None:
         self.controller = controller
-        self.controller.view.displayMenu.cardPaymentMenu.setAccounts(self.controller.model.accounts)
-        self.controller.model.selectedAccount = self.controller.view.displayMenu.cardPaymentMenu.accountSelect.currentData()
-        self.controller.model.selectedCard = self.controller.view.displayMenu.cardPaymentMenu.cardSelect.currentData()
+        cardMenu = self.controller.view.displayMenu.cardPaymentMenu
+        # only first page of accounts is listed, others are found by card number
+        cardMenu.setAccounts(self.controller.model.accounts.page())
+        self.controller.engine.selectCard(cardMenu.accountSelect.currentData(), cardMenu.cardSelect.currentData())
 
         self.listenSignal()
 
@@ -300,7 +451,7 @@ class CardPaymentMenuController:
         :return: None
         """
         self.controller.view.resetUI()
-        self.controller.model.reset()
+        self.controller.engine.reset()
 
     def _updateMessage(self) -> None:
         """
@@ -323,19 +474,41 @@ class CardPaymentMenuController:
         self.controller.view.setDisplayText(message)
 
     def _processPayment(self):
-        self.controller.model.processCardPayment()
-        if self.controller.model.error is not None:
-            self._updateMessage()
-        else:
-            self.controller.view.displayMenu.cardPaymentMenu.buttonPayment.setEnabled(False)
-            self.controller.view.displayMenu.cardPaymentMenu.buttonPayment.repaint()
-            self._setMessage()
+        # click queued before the button got disabled
+        if self.controller.engine.paid:
+            return
+        with METRICS.timer("ui_card_payment"):
+            result = self.controller.engine.pay()
+            if not result.ok:
+                self._updateMessage()
+            else:
+                # disabled right away, so a second click can't pay again before the next flush
+                buttonPayment = self.controller.view.displayMenu.cardPaymentMenu.buttonPayment
+                self.controller.view.updates.cancel(buttonPayment, "enabled")
+                buttonPayment.setEnabled(False)
+                self._setMessage()
 
     def _onAccountSelect(self):
         account = self.controller.view.displayMenu.cardPaymentMenu.accountSelect.currentData()
         self.controller.view.displayMenu.cardPaymentMenu.onAccountSelect(account)
-        self.controller.model.selectedAccount = account
-        self.controller.model.selectedCard = self.controller.view.displayMenu.cardPaymentMenu.cardSelect.currentData()
+        self.controller.engine.selectCard(account, self.controller.view.displayMenu.cardPaymentMenu.cardSelect.currentData())
+
+    def _onCardNumberEntered(self) -> None:
+        """
+        Looks up entered card number and selects its account and card
+        :return: None
+        """
+        cardMenu = self.controller.view.displayMenu.cardPaymentMenu
+        accounts = self.controller.model.accounts
+        accountNumber = cardMenu.cardNumberInput.text().strip()
+        card = accounts.findCard(accountNumber)
+        if card is None:
+            self.controller.view.setDisplayText(f"Nie znaleziono karty: {accountNumber}")
+            return
+        account = accounts.findAccount(accountNumber)
+        cardMenu.showAccount(account, card)
+        self.controller.engine.selectCard(account, card)
+        self._updateMessage()
 
     def listenSignal(self) -> None:
         """
@@ -343,6 +516,7 @@ class CardPaymentMenuController:
         :return: None
         """
         cardMenu = self.controller.view.displayMenu.cardPaymentMenu
+        cardMenu.cardNumberInput.returnPressed.connect(partial(self._onCardNumberEntered))
         cardMenu.buttonPayment.clicked.connect(partial(self._processPayment))
         cardMenu.accountSelect.currentIndexChanged.connect(partial(self._onAccountSelect))
         cardMenu.buttonReset.clicked.connect(partial(self._reset))
@@ -0,0 +1,240 @@
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from decimal import Decimal
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Union
+
+from .journal import changeToRecord
+from .metrics import timed
+from .model import Core, Product, Account, Card
+from .stock import Position
+from .money import Money
+
+
+class State(Enum):
+    """
+    Transaction states. Values are names of matching display menus
+    """
+    IDLE = "empty"
+    CURRENCY = "currency"
+    PAYMENT_TYPE = "paymentType"
+    CASH = "cash"
+    CASH_RESULT = "cashResult"
+    CARD = "card"
+
+
+class TransitionError(Exception):
+    """
+    Action isn't allowed in current transaction state
+    """
+
+
+@dataclass
+class Result:
+    """
+    Outcome of transaction step
+    """
+    state: State
+    error: Optional[str] = None
+    product: Optional[Product] = None
+    enteredAmount: Money = Money(0, "PLN")
+    payed: Optional[Money] = None
+    change: Optional[Dict[str, List[str]]] = None
+    # during cash payment: some accepted coin would bring payment to change which can't be given
+    exactChangeOnly: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class TransactionEngine:
+    """
+    Headless purchase state machine around Core model.
+    Doesn't depend on PyQt5, so it can be used by GUI controllers, servers and simulations alike.
+    Steps are recorded in machine journal, if it has one
+    """
+
+    def __init__(self, model: Optional[Core] = None) -> None:
+        self.model = model if model is not None else Core()
+        self._state = State.IDLE
+        # called with new state after it changes, e.g. to inhibit coin acceptor outside cash payment
+        self.listeners: List[Callable[[State], None]] = []
+        self.paid = False
+        self.session = uuid.uuid4().hex[:12]
+
+    @property
+    def state(self) -> State:
+        return self._state
+
+    @state.setter
+    def state(self, state: State) -> None:
+        if state is self._state:
+            return
+        self._state = state
+        for listener in self.listeners:
+            listener(state)
+
+    def _journal(self, recordType: str, **fields) -> None:
+        journal = self.model.machine.journal
+        if journal is not None:
+            journal.record(recordType, s=self.session, **fields)
+
+    def result(self) -> Result:
+        """
+        :return: current transaction state as result
+        """
+        return Result(
+            state=self.state,
+            error=self.model.error,
+            product=self.model.selectedProduct,
+            enteredAmount=self.model.enteredAmount,
+            payed=self.model.payed,
+            change=self.model.change,
+            exactChangeOnly=self.state == State.CASH and self.model.exactChangeOnly
+        )
+
+    def _expect(self, *states: State) -> None:
+        if self.state not in states:
+            raise TransitionError(f"Action not allowed in state: {self.state.name}")
+        if self.paid:
+            raise TransitionError("Transaction already paid")
+
+    @timed("select_product")
+    def selectProduct(self, name: str, price: Union[Money, Decimal], position: Optional[Position] = None) -> Result:
+        """
+        Selects product and reserves it in its slot. Default currency 'PLN'.
+        Transaction stays idle with error if the slot is sold out
+        :param name: product name
+        :param price: product price in PLN
+        :param position: slot position, position of catalog item with given name by default.
+        Products without slot aren't reserved
+        :return: result
+        """
+        self._expect(State.IDLE)
+        if position is None:
+            item = self.model.machine.catalog.byName(name)
+            position = item.position if item is not None else None
+        if position is not None and not self.model.reserveSlot(position):
+            return self.result()
+        self.model.selectedProduct = Product(name, price)
+        self.state = State.CURRENCY
+        self._journal("select", name=name, price=self.model.selectedProduct.base_price.minor,
+                      slot=list(position) if position is not None else None)
+        return self.result()
+
+    def chooseCurrency(self, currency: str) -> Result:
+        """
+        Converts product price to given currency
+        :param currency: 'USD', 'PLN' or 'EUR'
+        :return: result
+        """
+        self._expect(State.CURRENCY)
+        self.model.selectedProduct.convertCurrency(currency)
+        self.state = State.PAYMENT_TYPE
+        self._journal("currency", currency=currency)
+        return self.result()
+
+    def choosePaymentType(self, paymentType: str) -> Result:
+        """
+        :param paymentType: 'cash' or 'card'
+        :return: result
+        """
+        self._expect(State.PAYMENT_TYPE)
+        states = {
+            "cash": State.CASH,
+            "card": State.CARD
+        }
+        if paymentType not in states:
+            raise ValueError(f"Invalid payment type given: {paymentType}")
+        self.state = states[paymentType]
+        self._journal("payment", type=paymentType)
+        return self.result()
+
+    def insertCoin(self, value: Union[Money, Decimal]) -> Result:
+        """
+        Inserts coin in selected currency
+        :param value: coin value
+        :return: result
+        """
+        self._expect(State.CASH)
+        coin = Money.of(value, self.model.selectedProduct.currency)
+        self.model.insertDenomination(coin)
+        self._journal("coin", value=coin.minor, currency=coin.currency)
+        return self.result()
+
+    @timed("insert_coins")
+    def insertCoins(self, values: List[Union[Money, Decimal]]) -> Result:
+        """
+        Inserts batch of coins in selected currency, recorded as one journal record per coin value
+        :param values: coin values
+        :return: result
+        """
+        self._expect(State.CASH)
+        currency = self.model.selectedProduct.currency
+        coins = [Money.of(value, currency) for value in values]
+        if any(coin.currency != currency for coin in coins):
+            raise ValueError(f"Only {currency} coins can be inserted")
+        self.model.insertDenominations(coins)
+        for value, amount in Counter(coin.minor for coin in coins).items():
+            self._journal("coin", value=value, currency=currency, amount=amount)
+        return self.result()
+
+    def refundCoins(self, coins: List[Money]) -> None:
+        """
+        Records coins accepted by coin device which couldn't be inserted, e.g. they arrived after
+        the device was inhibited or aren't in selected currency. They are paid back in the same denominations,
+        so the store doesn't change. Allowed in any state
+        :param coins: refunded coins
+        :return: None
+        """
+        for (value, currency), amount in Counter((coin.minor, coin.currency) for coin in coins).items():
+            self._journal("refund", value=value, currency=currency, amount=amount)
+
+    def selectCard(self, account: Optional[Account], card: Optional[Card]) -> Result:
+        """
+        Selects account and card used for card payment. Can be done before card payment is chosen
+        :param account: account
+        :param card: one of account cards
+        :return: result
+        """
+        self.model.selectedAccount = account
+        self.model.selectedCard = card
+        self._journal("card", account=card.accountNumber if card is not None else None)
+        return self.result()
+
+    def pay(self) -> Result:
+        """
+        Pays for product with chosen payment type
+        :return: result
+        """
+        self._expect(State.CASH, State.CARD)
+        slot = list(self.model.reservedSlot) if self.model.reservedSlot is not None else None
+        if self.state == State.CASH:
+            self.model.processCashPayment()
+            if self.model.error is None:
+                self.state = State.CASH_RESULT
+            self._journal("pay", error=self.model.error, change=changeToRecord(self.model.changeDenominations),
+                          slot=slot if self.model.error is None else None)
+        else:
+            self.model.processCardPayment()
+            self.paid = self.model.error is None
+            debit = None
+            if self.paid:
+                card = self.model.selectedCard
+                price = self.model.selectedProduct.getConvertedPrice(card.currency)
+                debit = [card.accountNumber, price.minor, price.currency]
+            self._journal("pay", error=self.model.error, debit=debit, slot=slot if self.paid else None)
+        return self.result()
+
+    def reset(self) -> Result:
+        """
+        Resets transaction. Selected account and card are kept
+        :return: result
+        """
+        self.model.reset()
+        self.state = State.IDLE
+        self.paid = False
+        self._journal("reset")
+        return self.result()
@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+from .ledger import Ledger
+from .model import Machine, Denomination
+from .money import Money
+
+
+class Journal:
+    """
+    Append-only journal of transaction steps, one JSON record per line.
+
+    Records are written right away, but fsync is done for a group of records on background thread:
+    every interval seconds, or sooner once batchSize records are waiting for it.
+    So a crash can lose at most the last group, and no step waits for the disk, e.g. on server event loop.
+    Record torn by a crash is cut off when the journal is opened again, so new records start on a new line.
+    New journal starts with 'init' record holding machine inventory, card balances and slot stock
+    """
+
+    def __init__(self, path: str, machine: Machine, batchSize: int = 64, interval: float = 0.01) -> None:
+        self.path = path
+        self.batchSize = batchSize
+        self.interval = interval
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        Journal.truncateTorn(path)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        if self._file.tell() == 0:
+            self.record("init", inventory=machine.inventory.snapshot(), balances=machine.accounts.balances(),
+                        stock=machine.stock.snapshot())
+            self.sync()
+
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+        self._flusher = threading.Thread(target=self._flush, name="journal-sync", daemon=True)
+        self._flusher.start()
+
+    def record(self, recordType: str, **fields) -> None:
+        """
+        Appends record to the journal
+        :param recordType: 'init', 'select', 'currency', 'payment', 'card', 'coin', 'refund', 'pay', 'reset' or 'refill'
+        :param fields: record fields, must be JSON serializable
+        :return: None
+        """
+        line = json.dumps({"t": recordType, "ts": time.time(), **fields}, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._pending += 1
+            if self._pending == self.batchSize:
+                self._wake.set()
+
+    def sync(self) -> None:
+        """
+        Forces written records to disk
+        :return: None
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            self._file.flush()
+            self._pending = 0
+        # records can be written while waiting for the disk
+        os.fsync(self._file.fileno())
+
+    def _flush(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.sync()
+
+    def close(self) -> None:
+        """
+        Syncs remaining records and closes journal
+        :return: None
+        """
+        self._stopped.set()
+        self._wake.set()
+        self._flusher.join()
+        self.sync()
+        with self._lock:
+            self._file.close()
+
+    @staticmethod
+    def truncateTorn(path: str) -> None:
+        """
+        Cuts off record torn by a crash, i.e. everything after the last newline
+        :param path: journal path
+        :return: None
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, "rb+") as file:
+            end = file.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                size = min(4096, position)
+                file.seek(position - size)
+                newline = file.read(size).rfind(b"\n")
+                if newline >= 0:
+                    position = position - size + newline + 1
+                    break
+                position -= size
+            if position < end:
+                file.truncate(position)
+                file.flush()
+                os.fsync(file.fileno())
+
+    @staticmethod
+    def read(path: str) -> Iterator[Dict]:
+        """
+        Reads journal records. Record torn by a crash, i.e. line without newline, is skipped as it's
+        cut off when the journal is opened. So are records of older journals continued on a torn line
+        :param path: journal path
+        :return: records iterator
+        """
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if not line.endswith("\n"):
+                    return
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def changeToRecord(change: Optional[list]) -> Optional[list]:
+    """
+    :param change: list of denominations
+    :return: change as [currency, value in minor units, amount] lists
+    """
+    if change is None:
+        return None
+    return [[denomination.currency, denomination.value.minor, denomination.amount] for denomination in change]
+
+
+def changeFromRecord(record: list) -> list:
+    """
+    :param record: change as [currency, value in minor units, amount] lists
+    :return: list of denominations
+    """
+    return [Denomination(Money(value, currency), amount, currency) for currency, value, amount in record]
+
+
+def applyInit(machine: Machine, record: Dict) -> None:
+    """
+    Sets machine inventory, card balances and slot stock from 'init' record
+    :param machine: machine
+    :param record: 'init' record
+    :return: None
+    """
+    for currency, amounts in record["inventory"].items():
+        machine.inventory.setAmounts(currency, amounts)
+    # journals written before slot stock was tracked have no levels
+    machine.stock.setLevels(record.get("stock", []))
+    machine.accounts.setBalances(record["balances"])
+
+    # ledger keeps its own view of available balances
+    ledger = machine.ledger
+    ledger.close()
+    machine.ledger = Ledger(machine.accounts, ledger.batchSize, ledger.interval)
+
+
+def recover(machine: Machine, path: str) -> int:
+    """
+    Rebuilds machine inventory and card balances by replaying journal.
+    Machine state is set from 'init' record and then inserted coins, given change,
+    card debits, sold products and slot refills are applied in journal order
+    :param machine: machine to recover, it shouldn't have journal attached yet
+    :param path: journal path
+    :return: number of replayed records, 0 if journal doesn't exist
+    """
+    if not os.path.exists(path):
+        return 0
+
+    replayed = 0
+    for record in Journal.read(path):
+        replayed += 1
+        recordType = record["t"]
+        if recordType == "pay" and record.get("slot"):
+            machine.stock.remove(tuple(record["slot"]))
+        if recordType == "init":
+            applyInit(machine, record)
+        elif recordType == "refill":
+            machine.stock.setLevel(tuple(record["slot"]), record["quantity"])
+        elif recordType == "coin":
+            machine.inventory.credit(record["currency"], Money(record["value"], record["currency"]),
+                                     record.get("amount", 1))
+        elif recordType == "pay" and record.get("change"):
+            machine.inventory.debit(changeFromRecord(record["change"]))
+        elif recordType == "pay" and record.get("debit"):
+            accountNumber, value, currency = record["debit"]
+            card = machine.findCard(accountNumber)
+            if card is None:
+                raise ValueError(f"Unknown card in journal: {accountNumber}")
+            machine.ledger.debit(card, Money(value, currency))
+
+    machine.ledger.settle()
+    return replayed
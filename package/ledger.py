@@ -0,0 +1,127 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+from .money import Money
+
+if TYPE_CHECKING:
+    from .accounts import AccountRepository
+    from .model import Card
+
+
+@dataclass(frozen=True)
+class LedgerEntry:
+    """
+    Single card debit. Entries are never changed or removed
+    """
+    sequence: int
+    accountNumber: str
+    amount: Money
+    timestamp: float
+
+
+class Ledger:
+    """
+    Card ledger with atomic check-and-debit per card.
+
+    Every debit is checked against available balance and recorded as ledger entry
+    under the card lock, so concurrent payments can't overdraw a card.
+    Card.balance itself is settled in batches: every batchSize entries
+    or every interval seconds (if interval is given), and settled balances are saved in account repository.
+    Cards are registered on first use, so large card base isn't loaded up front
+    """
+
+    def __init__(self, accounts: "AccountRepository", batchSize: int = 1, interval: Optional[float] = None) -> None:
+        self.accounts = accounts
+        self.batchSize = batchSize
+        self.interval = interval
+        self.entries: List[LedgerEntry] = []
+
+        self._cards: Dict[str, "Card"] = {}
+        self._available: Dict[str, Money] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registerLock = threading.Lock()
+
+        self._entriesLock = threading.Lock()
+        self._settleLock = threading.Lock()
+        self._settled = 0  # number of entries already applied to card balances
+
+        self._stopped = threading.Event()
+        self._flusher = None
+        if interval is not None:
+            self._flusher = threading.Thread(target=self._flush, name="ledger-settlement", daemon=True)
+            self._flusher.start()
+
+    def _register(self, card: "Card") -> threading.Lock:
+        with self._registerLock:
+            if card.accountNumber not in self._locks:
+                self._cards[card.accountNumber] = card
+                self._available[card.accountNumber] = card.balance
+                self._locks[card.accountNumber] = threading.Lock()
+            return self._locks[card.accountNumber]
+
+    def available(self, card: "Card") -> Money:
+        """
+        :param card: card
+        :return: balance including debits which aren't settled yet
+        """
+        lock = self._locks.get(card.accountNumber) or self._register(card)
+        with lock:
+            return self._available[card.accountNumber]
+
+    def debit(self, card: "Card", amount: Money) -> bool:
+        """
+        Debits card if it has enough funds
+        :param card: card
+        :param amount: amount in card currency
+        :return: False if there are not enough funds
+        """
+        lock = self._locks.get(card.accountNumber) or self._register(card)
+        with lock:
+            available = self._available[card.accountNumber]
+            if available < amount:
+                return False
+            self._available[card.accountNumber] = available - amount
+            with self._entriesLock:
+                self.entries.append(LedgerEntry(len(self.entries), card.accountNumber, amount, time.time()))
+                due = len(self.entries) - self._settled >= self.batchSize
+
+        if due:
+            self.settle()
+        return True
+
+    def settle(self) -> int:
+        """
+        Applies entries which aren't settled yet to card balances
+        :return: number of settled entries
+        """
+        with self._settleLock:
+            with self._entriesLock:
+                batch = self.entries[self._settled:]
+                self._settled += len(batch)
+
+            totals: Dict[str, Money] = {}
+            for entry in batch:
+                totals[entry.accountNumber] = totals.get(entry.accountNumber, Money(0, entry.amount.currency)) \
+                    + entry.amount
+            for accountNumber, total in totals.items():
+                card = self._cards[accountNumber]
+                with self._locks[accountNumber]:
+                    card.balance = card.balance - total
+            self.accounts.updateBalances(self._cards[accountNumber] for accountNumber in totals)
+            return len(batch)
+
+    def _flush(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.settle()
+
+    def close(self) -> None:
+        """
+        Stops periodic settlement and settles remaining entries
+        :return: None
+        """
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.settle()
@@ -0,0 +1,264 @@
+"""
+Latency histograms and counters of the purchase flow.
+
+Metrics are off by default and instrumented functions then cost one extra call and flag check.
+Once enabled, they can be exported to Prometheus text file (node exporter textfile collector)
+and served as JSON snapshot over HTTP
+"""
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = [0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+
+# Prefix of exported metric names
+PREFIX = "vending"
+
+
+class Histogram:
+    """
+    Cumulative-on-export latency histogram with fixed buckets
+    """
+
+    def __init__(self, buckets: List[float] = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def quantile(self, quantile: float) -> Optional[float]:
+        """
+        :param quantile: e.g. 0.99
+        :return: upper bound of bucket holding given quantile, None if there are no observations
+        """
+        if not self.count:
+            return None
+        rank = quantile * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.sum
+        cumulative = []
+        seen = 0
+        for bound, bucketCount in zip(self.buckets + [float("inf")], counts):
+            seen += bucketCount
+            cumulative.append(["+Inf" if bound == float("inf") else bound, seen])
+        return {"count": count, "sum": total, "buckets": cumulative,
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99)}
+
+
+class Metrics:
+    """
+    Named latency histograms and counters
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name: str, seconds: float) -> None:
+        if self.enabled:
+            self.histogram(name).observe(seconds)
+
+    def timer(self, name: str):
+        """
+        Context manager recording latency of its block
+        :param name: histogram name
+        """
+        return _Timer(self.histogram(name)) if self.enabled else _NO_TIMER
+
+    def increment(self, name: str, value: int = 1) -> None:
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def snapshot(self) -> Dict:
+        """
+        :return: JSON serializable metrics
+        """
+        return {
+            "timestamp": time.time(),
+            "histograms": {name: histogram.snapshot() for name, histogram in list(self.histograms.items())},
+            "counters": dict(self.counters)
+        }
+
+    def toPrometheus(self) -> str:
+        """
+        :return: metrics in Prometheus text exposition format
+        """
+        lines = []
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f"{PREFIX}_{name}_seconds"
+            snapshot = histogram.snapshot()
+            lines.append(f"# TYPE {metric} histogram")
+            for bound, count in snapshot["buckets"]:
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+            lines.append(f"{metric}_sum {snapshot['sum']}")
+            lines.append(f"{metric}_count {snapshot['count']}")
+        for name, value in sorted(self.counters.items()):
+            metric = f"{PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def writeTextfile(self, path: str) -> None:
+        """
+        Writes Prometheus text file atomically, so collector never reads half written file
+        :param path: file path, should end with .prom
+        :return: None
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporaryPath = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                file.write(self.toPrometheus())
+            os.replace(temporaryPath, path)
+        except BaseException:
+            os.unlink(temporaryPath)
+            raise
+
+
+class _Timer:
+
+    def __init__(self, histogram: Histogram) -> None:
+        self.histogram = histogram
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exception) -> None:
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+_NO_TIMER = nullcontext()
+
+METRICS = Metrics(enabled=os.environ.get("VENDING_METRICS") == "1")
+
+
+def timed(name: str) -> Callable:
+    """
+    Decorator recording call latency in METRICS histogram of given name.
+    Not meant for Qt slots, PyQt can't drop unused signal arguments through the wrapper, use METRICS.timer there
+    :param name: histogram name, e.g. 'calculate_change'
+    """
+
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                METRICS.histogram(name).observe(time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsExporter:
+    """
+    Periodically writes Prometheus text file and optionally serves metrics over HTTP:
+    /metrics in Prometheus format, /metrics.json as JSON snapshot
+    """
+
+    def __init__(self, metrics: Metrics = METRICS, path: Optional[str] = None, interval: float = 10.0,
+                 port: Optional[int] = None, host: str = "127.0.0.1") -> None:
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._writer = None
+        self._server = None
+
+        if path is not None:
+            self._writer = threading.Thread(target=self._write, name="metrics-export", daemon=True)
+            self._writer.start()
+        if port is not None:
+            self._server = ThreadingHTTPServer((host, port), self._handler())
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+    @property
+    def address(self):
+        return self._server.server_address if self._server is not None else None
+
+    def _write(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.metrics.writeTextfile(self.path)
+
+    def _handler(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path == "/metrics":
+                    body, contentType = metrics.toPrometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, contentType = json.dumps(metrics.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", contentType)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        return Handler
+
+    def close(self) -> None:
+        """
+        Stops exporting and writes the last text file
+        :return: None
+        """
+        self._stopped.set()
+        if self._writer is not None:
+            self._writer.join()
+            self.metrics.writeTextfile(self.path)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
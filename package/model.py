@@ -1,7 +1,26 @@
-from dataclasses import dataclass
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+from contextlib import ExitStack
+from dataclasses import dataclass, field
 from decimal import Decimal
 from random import randint
-from typing import List, Dict, Union, Optional
+from typing import List, Dict, Union, Optional, Tuple, TYPE_CHECKING
+
+from .catalog import Catalog
+from .change import MISSING, BaseChangeSolver, ChangeCache, CrossCurrencyChangeSolver, OptimalChangeSolver, \
+    ReachabilityIndex
+from .ledger import Ledger
+from .metrics import METRICS, timed
+from .money import Money
+from .rates import DEFAULT_RATES, PRICE_MATRIX
+from .stock import Position, SlotStock
+
+if TYPE_CHECKING:
+    from .accounts import AccountRepository
+    from .journal import Journal
 
 
 @dataclass
@@ -10,12 +29,14 @@ class Product:
     Product representation in a vending machine
     """
     name: str
-    price: Decimal
+    price: Money
     currency: str = "PLN"
 
     def __post_init__(self):
+        self.price = Money.of(self.price, self.currency)
         self.base_price = self.price
 
+    @timed("convert_currency")
     def convertCurrency(self, currency: str) -> None:
         """
         Converts product currency and price based on given currency
@@ -25,19 +46,14 @@ class Product:
         self.currency = currency
         self.price = self.getConvertedPrice(currency)
 
-    def getConvertedPrice(self, currency: str) -> Decimal:
+    def getConvertedPrice(self, currency: str) -> Money:
         """
-        Converts price for given currency
-        :param currency:
-        :return:
+        Converts price for given currency, using precomputed price matrix
+        :param currency: USD, PLN or EUR
+        :return: price in given currency
         """
         try:
-            price = {
-                "PLN": self.base_price.quantize(Decimal('0.01')),
-                "USD": (self.base_price * Decimal("0.26")).quantize(Decimal('0.01')),
-                "EUR": (self.base_price * Decimal("0.22")).quantize(Decimal('0.01'))
-            }
-            return price[currency]
+            return PRICE_MATRIX.price(self.base_price, currency)
         except KeyError:
             raise KeyError(f"Invalid currency type: {currency}")
 
@@ -45,19 +61,14 @@ class Product:
 @dataclass
 class Card:
     accountNumber: str
-    balance: Decimal
+    balance: Money
     currency: str
 
-    def pay(self, product: Product) -> None:
-        """
-        Pay for given price
-        :param product: Product
-        :return: None
-        """
-        self.balance = (self.balance - product.getConvertedPrice(self.currency)).quantize(Decimal('0.01'))
+    def __post_init__(self):
+        self.balance = Money.of(self.balance, self.currency)
 
     def __str__(self):
-        return f"{self.accountNumber} - {float(self.balance)} {self.currency}"
+        return f"{self.accountNumber} - {float(self.balance.toDecimal())} {self.currency}"
 
 
 @dataclass
@@ -72,10 +83,13 @@ class Denomination:
     Denomination representation in vending machine
     For now, it's just coins
     """
-    value: Decimal
+    value: Money
     amount: int
     currency: str
 
+    def __post_init__(self):
+        self.value = Money.of(self.value, self.currency)
+
 
 def populateAccounts() -> List[Account]:
     accounts = []
@@ -97,6 +111,31 @@ def populateAccounts() -> List[Account]:
     return accounts
 
 
+# Coins accepted by the coin slot (cash payment buttons), per currency
+ACCEPTED_COINS = {
+    "PLN": ["0.50", "1.00", "2.00", "5.00"],
+    "USD": ["0.10", "0.25", "0.50", "1.00"],
+    "EUR": ["0.20", "0.50", "1.00", "2.00"]
+}
+ACCEPTED_COIN_UNITS = {currency: [Money.of(value, currency).minor for value in values]
+                       for currency, values in ACCEPTED_COINS.items()}
+
+# currencies whose coins may be added to change when store of product currency can't pay it alone,
+# in order of preference
+DEFAULT_CHANGE_FALLBACK = {
+    "PLN": [],
+    "USD": ["PLN"],
+    "EUR": ["PLN"]
+}
+
+# shown when selected product's slot is empty
+SOLD_OUT_ERROR = "Produkt wyprzedany!"
+
+# change amounts tracked by inventory reachability index, in minor units. Overpaying by one coin never needs
+# more change than the largest accepted coin, larger amounts are checked with change solver
+REACHABILITY_CEILING = 1000
+
+
 class BaseStore:
     """
     Abstract store
@@ -106,10 +145,25 @@ class BaseStore:
         self.currency = None
         self.denominationValues = None
         self.denominations = []
+        # guards denominations amounts, version is increased on every change
+        self.lock = threading.Lock()
+        self.version = 0
 
     def populateStore(self) -> None:
         for value in self.denominationValues:
-            self.denominations.append(Denomination(Decimal(value), randint(0, 20), self.currency))
+            self.denominations.append(Denomination(Money.of(value, self.currency), randint(0, 20), self.currency))
+
+    def findDenomination(self, value: Union[Money, Decimal]) -> Denomination:
+        """
+        Finds store denomination with given value
+        :param value: denomination value
+        :return: denomination kept in store
+        """
+        value = Money.of(value, self.currency)
+        for denomination in self.denominations:
+            if denomination.value == value:
+                return denomination
+        raise ValueError(f"Unknown denomination: {value} {self.currency}")
 
     def __str__(self) -> str:
         return f"<Store: {self.denominations}>"
@@ -154,23 +208,323 @@ class StoreEUR(BaseStore):
         self.populateStore()
 
 
+class Inventory:
+    """
+    Long-lived coin inventory of a vending machine, one store per currency.
+    It's credited with inserted coins, debited with given change and
+    can be persisted as a snapshot which is never left half written.
+    Every store has reachability index of change amounts it can give, updated with every coin movement
+    """
+
+    def __init__(self, path: Optional[str] = None, reachabilityCeiling: int = REACHABILITY_CEILING) -> None:
+        self.path = path
+        self.stores: Dict[str, BaseStore] = {store.currency: store for store in (StorePLN(), StoreUSD(), StoreEUR())}
+        self.reachability: Dict[str, ReachabilityIndex] = {}
+        for currency, store in self.stores.items():
+            self.reachability[currency] = ReachabilityIndex(
+                [denomination.value.minor for denomination in store.denominations], reachabilityCeiling)
+            self._reindex(store)
+
+    @classmethod
+    def load(cls, path: str) -> "Inventory":
+        """
+        Loads inventory from snapshot. New randomly populated inventory is created if snapshot doesn't exist
+        :param path: snapshot file path
+        :return: inventory
+        """
+        inventory = cls(path)
+        if not os.path.exists(path):
+            inventory.save()
+            return inventory
+
+        with open(path, encoding="utf-8") as file:
+            snapshot = json.load(file)
+        for currency, amounts in snapshot.items():
+            inventory.setAmounts(currency, amounts)
+        return inventory
+
+    def getStore(self, currency: str) -> BaseStore:
+        """
+        :param currency: 'PLN', 'USD' or 'EUR'
+        :return: store with given currency
+        """
+        return self.stores[currency]
+
+    def setAmounts(self, currency: str, amounts: Dict[str, int]) -> None:
+        """
+        Replaces store contents, e.g. from snapshot
+        :param currency: store currency
+        :param amounts: number of coins per value in minor units, missing values are set to 0
+        :return: None
+        """
+        store = self.getStore(currency)
+        with store.lock:
+            for denomination in store.denominations:
+                denomination.amount = amounts.get(str(denomination.value.minor), 0)
+            store.version += 1
+            self._reindex(store)
+
+    def credit(self, currency: str, value: Union[Money, Decimal], amount: int = 1) -> None:
+        """
+        Adds coins to the store
+        :param currency: coin currency
+        :param value: coin value
+        :param amount: number of coins
+        :return: None
+        """
+        store = self.getStore(currency)
+        with store.lock:
+            store.findDenomination(value).amount += amount
+            store.version += 1
+            self._reindex(store)
+
+    def creditAll(self, currency: str, amounts: Dict[int, int]) -> None:
+        """
+        Adds batch of coins to the store, with one lock and one index update
+        :param currency: coins currency
+        :param amounts: number of coins per value in minor units
+        :return: None
+        """
+        store = self.getStore(currency)
+        with store.lock:
+            for value, amount in amounts.items():
+                store.findDenomination(Money(value, currency)).amount += amount
+            store.version += 1
+            self._reindex(store)
+
+    def read(self, currency: str) -> Tuple[int, List[int], List[int]]:
+        """
+        Consistent view of the store for change solvers
+        :param currency: store currency
+        :return: store version, denomination values in minor units and amounts
+        """
+        store = self.getStore(currency)
+        with store.lock:
+            return (store.version,
+                    [denomination.value.minor for denomination in store.denominations],
+                    [denomination.amount for denomination in store.denominations])
+
+    def commit(self, currency: str, version: int, denominations: List[Denomination]) -> bool:
+        """
+        Takes given coins out of the store, if it wasn't changed since given version
+        :param currency: store currency
+        :param version: store version change was calculated for
+        :param denominations: coins to take
+        :return: False if store was changed in meantime and change has to be calculated again
+        """
+        store = self.getStore(currency)
+        with store.lock:
+            if store.version != version:
+                return False
+            self._take(store, denominations)
+            return True
+
+    def canGiveChange(self, currency: str, amount: int) -> Optional[bool]:
+        """
+        Checks in reachability index if change can be given, without running change solver
+        :param currency: store currency
+        :param amount: change in minor units
+        :return: whether change can be given, None if amount is above index ceiling
+        """
+        store = self.getStore(currency)
+        index = self.reachability[currency]
+        with store.lock:
+            if index.version != store.version:
+                self._reindex(store)
+            return index.canPay(amount)
+
+    def payable(self, currency: str) -> Tuple[int, int]:
+        """
+        :param currency: store currency
+        :return: bitset of change amounts the store can give, from reachability index, and its ceiling
+        """
+        store = self.getStore(currency)
+        index = self.reachability[currency]
+        with store.lock:
+            if index.version != store.version:
+                self._reindex(store)
+            return index.payable, index.ceiling
+
+    def _reindex(self, store: BaseStore) -> None:
+        index = self.reachability[store.currency]
+        index.update([denomination.amount for denomination in store.denominations])
+        index.version = store.version
+
+    def commitAll(self, versions: Dict[str, int], denominations: List[Denomination]) -> bool:
+        """
+        Takes coins out of several stores at once, if none of them was changed since given versions
+        :param versions: store version change was calculated for, per currency
+        :param denominations: coins to take, in currencies of versions
+        :return: False if some store was changed in meantime and change has to be calculated again
+        """
+        stores = [self.getStore(currency) for currency in sorted(versions)]
+        with ExitStack() as stack:
+            # always locked in the same order
+            for store in stores:
+                stack.enter_context(store.lock)
+            if any(store.version != versions[store.currency] for store in stores):
+                return False
+            for store in stores:
+                self._take(store, [denomination for denomination in denominations
+                                   if denomination.currency == store.currency])
+            return True
+
+    def debit(self, denominations: List[Denomination]) -> None:
+        """
+        Takes given coins out of stores
+        :param denominations: coins to take, e.g. calculated change
+        :return: None
+        """
+        for denomination in denominations:
+            store = self.getStore(denomination.currency)
+            with store.lock:
+                self._take(store, [denomination])
+
+    def _take(self, store: BaseStore, denominations: List[Denomination]) -> None:
+        stored = [store.findDenomination(denomination.value) for denomination in denominations]
+        for denomination, storedDenomination in zip(denominations, stored):
+            if storedDenomination.amount < denomination.amount:
+                raise ValueError(f"Not enough {denomination.value} {denomination.currency} denominations in store")
+        for denomination, storedDenomination in zip(denominations, stored):
+            storedDenomination.amount -= denomination.amount
+        store.version += 1
+        self._reindex(store)
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """
+        :return: number of coins per currency and value in minor units
+        """
+        snapshot = {}
+        for currency, store in self.stores.items():
+            with store.lock:
+                snapshot[currency] = {str(denomination.value.minor): denomination.amount
+                                      for denomination in store.denominations}
+        return snapshot
+
+    def save(self) -> None:
+        """
+        Saves snapshot to the inventory path, if it's set.
+        Snapshot is written to temporary file first and then atomically replaces the old one
+        :return: None
+        """
+        if self.path is None:
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporaryPath = tempfile.mkstemp(dir=directory, prefix=".inventory-")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                json.dump(self.snapshot(), file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporaryPath, self.path)
+        except BaseException:
+            os.unlink(temporaryPath)
+            raise
+
+        # make rename itself durable
+        if hasattr(os, "O_DIRECTORY"):
+            directoryDescriptor = os.open(directory, os.O_DIRECTORY)
+            try:
+                os.fsync(directoryDescriptor)
+            finally:
+                os.close(directoryDescriptor)
+
+
+class Machine:
+    """
+    Machine-wide state shared by all customer sessions: coin inventory, accounts, card ledger,
+    product catalog and slot stock, change solver and its cache.
+    Coin stores use optimistic versioning, card debits go through the ledger.
+    Default ledger settles every debit right away, so card balances shown in GUI are always current
+    """
+
+    def __init__(self, inventory: Optional[Inventory] = None,
+                 accounts: Optional[Union["AccountRepository", List[Account]]] = None,
+                 solver: Optional[BaseChangeSolver] = None, ledger: Optional[Ledger] = None,
+                 catalog: Optional[Catalog] = None, changeCache: Optional[ChangeCache] = None,
+                 changeFallback: Optional[Dict[str, List[str]]] = None, stock: Optional[SlotStock] = None) -> None:
+        # accounts module builds on this one
+        from .accounts import AccountRepository, InMemoryAccountRepository
+
+        self.inventory = inventory if inventory is not None else Inventory()
+        self.accounts = accounts if isinstance(accounts, AccountRepository) else InMemoryAccountRepository(accounts)
+        self.solver = solver if solver is not None else OptimalChangeSolver()
+        self.ledger = ledger if ledger is not None else Ledger(self.accounts)
+        self.catalog = catalog if catalog is not None else Catalog()
+        self.stock = stock if stock is not None else SlotStock()
+        # every product of the catalog has its slot, so stock snapshots cover all of them
+        for item in self.catalog:
+            self.stock.slot(item.position)
+        # change solutions of the solver above, with their change tables
+        self.changeCache = changeCache if changeCache is not None else ChangeCache()
+        # which currencies may be mixed into change, see DEFAULT_CHANGE_FALLBACK
+        self.changeFallback = changeFallback if changeFallback is not None else DEFAULT_CHANGE_FALLBACK
+        self.crossCurrencySolver = CrossCurrencyChangeSolver(self.solver)
+        # write-ahead journal of transaction steps, see package.journal
+        self.journal: Optional["Journal"] = None
+
+    def findCard(self, accountNumber: str) -> Optional[Card]:
+        """
+        :param accountNumber: card account number
+        :return: card or None if there is no such card
+        """
+        return self.accounts.findCard(accountNumber)
+
+    def session(self) -> "Core":
+        """
+        :return: new customer session on this machine
+        """
+        return Core(machine=self)
+
+    def refillSlot(self, position: Position, quantity: Optional[int] = None) -> None:
+        """
+        Sets number of products in the slot after it was refilled, recorded in the journal
+        :param position: slot position
+        :param quantity: number of products in the slot, stock capacity by default
+        :return: None
+        """
+        quantity = self.stock.capacity if quantity is None else quantity
+        if quantity < 0:
+            raise ValueError(f"Invalid slot quantity: {quantity}")
+        self.stock.setLevel(position, quantity)
+        if self.journal is not None:
+            self.journal.record("refill", slot=list(position), quantity=quantity)
+
+
 @dataclass
 class Core:
     """
-    Top level model in vending-machine
+    Top level model in vending-machine. Holds state of one customer session,
+    machine-wide state is shared through machine
     """
     selectedProduct: Optional[Product] = None
     selectedAccount: Optional[Account] = None
     selectedCard: Optional[Card] = None
     store: Optional[Union[StorePLN, StoreUSD, StoreEUR]] = None
-    payed: Optional[Decimal] = None
+    payed: Optional[Money] = None
     error: Optional[str] = None
     change: Optional[Dict[str, List[str]]] = None
-    enteredAmount: Decimal = Decimal("0.00")
+    changeDenominations: Optional[List[Denomination]] = None
+    enteredAmount: Money = Money(0, "PLN")
+    # slot of selected product while it's reserved for this session
+    reservedSlot: Optional[Position] = None
+    machine: Machine = field(default_factory=Machine)
+
+    @property
+    def accounts(self) -> "AccountRepository":
+        return self.machine.accounts
 
-    def __post_init__(self) -> None:
-        self.accounts: List[Account] = populateAccounts()
+    @property
+    def inventory(self) -> Inventory:
+        return self.machine.inventory
 
+    @property
+    def solver(self) -> BaseChangeSolver:
+        return self.machine.solver
+
+    @timed("process_cash_payment")
     def processCashPayment(self) -> None:
         """
         Processing cash payment
@@ -179,40 +533,123 @@ class Core:
         self.error = None
         if self.enteredAmount < self.selectedProduct.price:
             self.error = "Za mało pieniędzy!"
+            METRICS.increment("insufficient_cash")
+            return
         change = self.calculateChange()
         if change is not None:
-            self.change = self.changeToTable(change)
+            self.changeDenominations = change
+            self.commitSlot()
+        self.inventory.save()
 
+    @timed("process_card_payment")
     def processCardPayment(self) -> None:
         self.error = None
         if self.selectedAccount is None:
             self.error = "Error: wybierz konto"
         elif self.selectedCard is None:
             self.error = "Error: wybierz kartę"
-        elif self.selectedCard.balance < self.selectedProduct.getConvertedPrice(
-                self.selectedCard.currency):
+        elif not self.machine.ledger.debit(self.selectedCard,
+                                           self.selectedProduct.getConvertedPrice(self.selectedCard.currency)):
             self.error = f"Error: nie wystarczy środków na koncie. środki: " \
-                         f"{self.selectedCard.balance}{self.selectedCard.currency}"
+                         f"{self.machine.ledger.available(self.selectedCard)}{self.selectedCard.currency}"
+            METRICS.increment("insufficient_funds")
         else:
-            self.selectedCard.pay(self.selectedProduct)
+            self.commitSlot()
 
-    def insertDenomination(self, value: Decimal) -> None:
-        self.enteredAmount += value
+    def reserveSlot(self, position: Position) -> bool:
+        """
+        Reserves product of selected slot for this session
+        :param position: slot position
+        :return: False if the slot is sold out
+        """
+        self.error = None
+        if not self.machine.stock.reserve(position):
+            self.error = SOLD_OUT_ERROR
+            METRICS.increment("sold_out")
+            return False
+        self.reservedSlot = position
+        return True
+
+    def commitSlot(self) -> None:
+        """
+        Takes paid product out of its slot
+        :return: None
+        """
+        if self.reservedSlot is not None:
+            self.machine.stock.commit(self.reservedSlot)
+            self.reservedSlot = None
 
-    @staticmethod
-    def getCurrencyStore(currency: str) -> Union[StorePLN, StoreUSD, StoreEUR]:
+    def releaseSlot(self) -> None:
+        """
+        Returns product which wasn't paid for to its slot
+        :return: None
+        """
+        if self.reservedSlot is not None:
+            self.machine.stock.release(self.reservedSlot)
+            self.reservedSlot = None
+
+    @timed("insert_denomination")
+    def insertDenomination(self, value: Union[Money, Decimal]) -> None:
+        coin = Money.of(value, self.selectedProduct.currency)
+        self.inventory.credit(coin.currency, coin)
+        self.enteredAmount += coin
+
+    def insertDenominations(self, coins: List[Money]) -> None:
+        """
+        Inserts batch of coins, e.g. read from coin acceptor
+        :param coins: coins in selected product currency
+        :return: None
         """
-        Currency store factory
+        currency = self.selectedProduct.currency
+        self.inventory.creditAll(currency, Counter(coin.minor for coin in coins))
+        self.enteredAmount += Money(sum(coin.minor for coin in coins), currency)
+
+    def canGiveChange(self, amount: Money) -> bool:
+        """
+        Checks if change can be given. Answered by inventory reachability index,
+        change solver runs only for amounts above its ceiling and when other currencies have to help
+        :param amount: change
+        :return: True if change can be given
+        """
+        payable = self.inventory.canGiveChange(amount.currency, amount.minor)
+        if payable is None:
+            _, values, limits = self.inventory.read(amount.currency)
+            payable = self.solver.solve(amount.minor, values, limits) is not None
+        if not payable:
+            for otherCurrency in self.machine.changeFallback.get(amount.currency, []):
+                convert = DEFAULT_RATES.converter(amount.currency, otherCurrency)
+                rows, ceiling = self.inventory.payable(amount.currency)
+                otherRows, otherCeiling = self.inventory.payable(otherCurrency)
+                if amount.minor <= ceiling and convert(amount.minor) <= otherCeiling:
+                    parts = CrossCurrencyChangeSolver.splitPayable(amount.minor, rows, otherRows, convert)
+                else:
+                    _, values, limits = self.inventory.read(amount.currency)
+                    _, otherValues, otherLimits = self.inventory.read(otherCurrency)
+                    parts = self.machine.crossCurrencySolver.split(amount.minor, values, limits,
+                                                                   otherValues, otherLimits, convert)
+                if parts is not None:
+                    return True
+        return payable
+
+    @property
+    def exactChangeOnly(self) -> bool:
+        """
+        :return: True if inserting some accepted coin could bring payment to change which can't be given
+        """
+        price = self.selectedProduct.price
+        for coin in ACCEPTED_COIN_UNITS[price.currency]:
+            due = self.enteredAmount.minor + coin - price.minor
+            if due > 0 and not self.canGiveChange(Money(due, price.currency)):
+                return True
+        return False
+
+    def getCurrencyStore(self, currency: str) -> Union[StorePLN, StoreUSD, StoreEUR]:
+        """
+        Returns machine store
         :param currency: 'PLN', 'USD' or 'EUR'
         :return: store based on given currency
         """
-
-        store = {
-            "PLN": StorePLN(),
-            "USD": StoreUSD(),
-            "EUR": StoreEUR()
-        }
-        return store[currency]
+        return self.inventory.getStore(currency)
 
     @staticmethod
     def changeToTable(change: List[Denomination]) -> Dict[str, List[str]]:
@@ -235,47 +672,88 @@ class Core:
 
         return table
 
+    @timed("calculate_change")
     def calculateChange(self) -> Optional[List[Denomination]]:
         """
-        Algorithm which calculates amount and type of denominations
+        Calculates amount and type of denominations using configured change solver
+        and takes them out of the store. Sets change table of the result as well.
+        Solutions are reused from machine change cache, together with their tables
         :return: list of denominations or None if it can't be calculated
         """
 
-        change = []
         toPay = self.enteredAmount - self.selectedProduct.price
         self.payed = toPay
-        self.store = self.getCurrencyStore(self.selectedProduct.currency)
-
-        for denomination in self.store.denominations:
-            # if sum can already be given then break calculations
-            if toPay <= 0:
-                break
-
-            # calculates maximum numbers of denominations in current denomination
-            numberOfDenominations = int(toPay // denomination.value)
-
-            # if denomination can be given and it exists in store then add
-            if 0 < numberOfDenominations <= denomination.amount:
-                toPay = toPay - (denomination.value * numberOfDenominations)
-                change.append(Denomination(denomination.value, numberOfDenominations,
-                                           denomination.currency))
-
-        # Display error if change can't be given
-        if toPay > 0:
-            self.error = "Nie można wydać resztę"
-            return None
-        else:
-            return change
+        currency = self.selectedProduct.currency
+        self.store = self.getCurrencyStore(currency)
+        cache = self.machine.changeCache
+
+        while True:
+            version, values, limits = self.inventory.read(currency)
+            key = (currency, toPay.minor, self.solver.cacheKey(toPay.minor, values, limits))
+            solution = cache.get(key)
+            if solution is MISSING:
+                counts = self.solver.solve(toPay.minor, values, limits)
+                if counts is not None:
+                    change = [Denomination(denomination.value, count, denomination.currency)
+                              for denomination, count in zip(self.store.denominations, counts) if count > 0]
+                    solution = (change, self.changeToTable(change))
+                else:
+                    solution = None
+                cache.put(key, solution)
+
+            # Display error if change can't be given
+            if solution is None:
+                change = self.calculateCrossCurrencyChange(toPay)
+                if change is None:
+                    self.error = "Nie można wydać resztę"
+                    METRICS.increment("change_failures")
+                    return None
+                self.change = self.changeToTable(change)
+                return change
+
+            # cached denominations and tables are shared, they are never modified
+            change, table = solution
+            # retry if other session changed the store in meantime
+            if self.inventory.commit(currency, version, change):
+                self.change = table
+                return list(change)
+
+    def calculateCrossCurrencyChange(self, toPay: Money) -> Optional[List[Denomination]]:
+        """
+        Calculates change paid partly with coins of other currencies allowed by machine change fallback,
+        and takes them out of the stores
+        :param toPay: change in product currency
+        :return: list of denominations in both currencies or None if it can't be calculated
+        """
+        currency = toPay.currency
+        store = self.getCurrencyStore(currency)
+        for otherCurrency in self.machine.changeFallback.get(currency, []):
+            otherStore = self.getCurrencyStore(otherCurrency)
+            while True:
+                version, values, limits = self.inventory.read(currency)
+                otherVersion, otherValues, otherLimits = self.inventory.read(otherCurrency)
+                counts = self.machine.crossCurrencySolver.solve(toPay.minor, values, limits, otherValues, otherLimits,
+                                                                DEFAULT_RATES.converter(currency, otherCurrency))
+                if counts is None:
+                    break
+                change = [Denomination(denomination.value, count, denomination.currency)
+                          for coinStore, storeCounts in zip((store, otherStore), counts)
+                          for denomination, count in zip(coinStore.denominations, storeCounts) if count > 0]
+                if self.inventory.commitAll({currency: version, otherCurrency: otherVersion}, change):
+                    METRICS.increment("cross_currency_change")
+                    return change
+        return None
 
     def reset(self) -> None:
         """
-        Reset model
+        Reset model, reserved product is released
         :return: None
         """
-
+        self.releaseSlot()
         self.selectedProduct = None
         self.store = None
         self.change = None
-        self.enteredAmount = Decimal("0.00")
+        self.changeDenominations = None
+        self.enteredAmount = Money(0, "PLN")
         self.error = None
         self.payed = None
@@ -0,0 +1,108 @@
+from decimal import Decimal
+from typing import NamedTuple, Union
+
+# Number of minor units (grosz/cent) in one major unit
+MINOR_UNITS = 100
+
+# creates tuple subclass instance without going through generated __new__
+_new = tuple.__new__
+
+
+def toMinorUnits(value: Decimal) -> int:
+    """
+    Converts decimal amount to integer minor units
+    :param value: amount, e.g. Decimal("1.25")
+    :return: amount in minor units, e.g. 125
+    """
+    return int((value * MINOR_UNITS).to_integral_value())
+
+
+def fromMinorUnits(value: int) -> Decimal:
+    """
+    Converts integer minor units to decimal amount
+    :param value: amount in minor units, e.g. 125
+    :return: amount, e.g. Decimal("1.25")
+    """
+    return (Decimal(value) / MINOR_UNITS).quantize(Decimal('0.01'))
+
+
+class Money(NamedTuple):
+    """
+    Immutable amount of money kept as integer minor units.
+    Amounts in different currencies can't be mixed, except for zero which fits any currency.
+    It's a tuple underneath, so creating new amounts in arithmetic is cheap
+    """
+    minor: int
+    currency: str
+
+    @classmethod
+    def of(cls, value: Union["Money", Decimal, str, int], currency: str) -> "Money":
+        """
+        Creates money from decimal amount
+        :param value: amount in major units, e.g. Decimal("1.25") or "1.25"
+        :param currency: currency code
+        :return: money
+        """
+        if isinstance(value, Money):
+            return value
+        return cls(toMinorUnits(Decimal(value)), currency)
+
+    def toDecimal(self) -> Decimal:
+        """
+        :return: amount in major units, e.g. Decimal("1.25")
+        """
+        return fromMinorUnits(self.minor)
+
+    def _currency(self, other: "Money") -> str:
+        if self.currency == other.currency or not other.minor:
+            return self.currency
+        if not self.minor:
+            return other.currency
+        raise ValueError(f"Currency mismatch: {self.currency} and {other.currency}")
+
+    def __add__(self, other: "Money") -> "Money":
+        currency = self.currency if self.currency == other.currency else self._currency(other)
+        return _new(Money, (self.minor + other.minor, currency))
+
+    def __sub__(self, other: "Money") -> "Money":
+        currency = self.currency if self.currency == other.currency else self._currency(other)
+        return _new(Money, (self.minor - other.minor, currency))
+
+    def __mul__(self, number: int) -> "Money":
+        return Money(self.minor * number, self.currency)
+
+    __rmul__ = __mul__
+
+    def __floordiv__(self, other: "Money") -> int:
+        self._currency(other)
+        return self.minor // other.minor
+
+    def __neg__(self) -> "Money":
+        return Money(-self.minor, self.currency)
+
+    def __bool__(self) -> bool:
+        return self.minor != 0
+
+    def __lt__(self, other: "Money") -> bool:
+        self._currency(other)
+        return self.minor < other.minor
+
+    def __le__(self, other: "Money") -> bool:
+        self._currency(other)
+        return self.minor <= other.minor
+
+    def __gt__(self, other: "Money") -> bool:
+        self._currency(other)
+        return self.minor > other.minor
+
+    def __ge__(self, other: "Money") -> bool:
+        self._currency(other)
+        return self.minor >= other.minor
+
+    def __repr__(self) -> str:
+        return f"Money('{self}', '{self.currency}')"
+
+    def __str__(self) -> str:
+        sign = "-" if self.minor < 0 else ""
+        major, minor = divmod(abs(self.minor), MINOR_UNITS)
+        return f"{sign}{major}.{minor:02d}"
@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+from decimal import Decimal, ROUND_CEILING
+from fractions import Fraction
+from typing import Callable, Dict, Optional
+
+from .money import Money
+
+
+class ExchangeRates:
+    """
+    Versioned exchange rates table. Rates are PLN multipliers, e.g. 1 PLN = 0.26 USD.
+    Version is increased on every reload, so dependent caches know when to rebuild
+    """
+
+    def __init__(self, rates: Optional[Dict[str, Decimal]] = None, path: Optional[str] = None) -> None:
+        self.rates: Dict[str, Decimal] = {}
+        self.version = 0
+        self.path = path
+        self._modified: Optional[float] = None
+        self._lock = threading.Lock()
+        self.reload(rates if rates is not None else {
+            "PLN": Decimal("1.00"),
+            "USD": Decimal("0.26"),
+            "EUR": Decimal("0.22")
+        })
+
+    def reload(self, rates: Dict[str, Decimal]) -> None:
+        """
+        Replaces all rates
+        :param rates: PLN multiplier per currency
+        :return: None
+        """
+        with self._lock:
+            self.rates = {currency: Decimal(rate) for currency, rate in rates.items()}
+            self.version += 1
+
+    def reloadIfModified(self) -> bool:
+        """
+        Reloads rates from JSON file (e.g. {"USD": "0.26"}) if it was modified since last reload
+        :return: True if rates were reloaded
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return False
+        modified = os.path.getmtime(self.path)
+        if modified == self._modified:
+            return False
+
+        with open(self.path, encoding="utf-8") as file:
+            rates = json.load(file)
+        self.reload({currency: Decimal(str(rate)) for currency, rate in rates.items()})
+        self._modified = modified
+        return True
+
+    def convert(self, price: Money, currency: str) -> Money:
+        """
+        Converts PLN price to given currency
+        :param price: price in PLN
+        :param currency: target currency
+        :return: converted price
+        """
+        return Money(int((Decimal(price.minor) * self.rates[currency]).to_integral_value()), currency)
+
+    def converter(self, fromCurrency: str, toCurrency: str) -> Callable[[int], int]:
+        """
+        Integer only version of exchange, for converting many amounts
+        :param fromCurrency: source currency
+        :param toCurrency: target currency
+        :return: function converting minor units, rounding up like exchange
+        """
+        ratio = Fraction(self.rates[toCurrency]) / Fraction(self.rates[fromCurrency])
+        numerator, denominator = ratio.numerator, ratio.denominator
+        return lambda minor: -(-minor * numerator // denominator)
+
+    def exchange(self, amount: Money, currency: str) -> Money:
+        """
+        Converts amount between any two currencies, rounding up to whole minor unit,
+        so customer never gets less than is due
+        :param amount: amount
+        :param currency: target currency
+        :return: converted amount
+        """
+        rates = self.rates
+        value = Decimal(amount.minor) * rates[currency] / rates[amount.currency]
+        return Money(int(value.to_integral_value(rounding=ROUND_CEILING)), currency)
+
+
+class PriceMatrix:
+    """
+    Converted prices for every base price and currency. Matrix is built ahead of time and rebuilt
+    only when exchange rates version changes, so lookups are plain dict reads
+    """
+
+    def __init__(self, rates: ExchangeRates) -> None:
+        self.rates = rates
+        self._version = rates.version
+        self._prices: Dict[Money, Dict[str, Money]] = {}
+
+    def _row(self, price: Money) -> Dict[str, Money]:
+        return {currency: self.rates.convert(price, currency) for currency in self.rates.rates}
+
+    def rebuild(self) -> None:
+        """
+        Recalculates all known prices with current rates
+        :return: None
+        """
+        version = self.rates.version
+        self._prices = {price: self._row(price) for price in self._prices}
+        self._version = version
+
+    def price(self, price: Money, currency: str) -> Money:
+        """
+        :param price: base price in PLN
+        :param currency: 'PLN', 'USD' or 'EUR'
+        :return: price in given currency
+        """
+        if self._version != self.rates.version:
+            self.rebuild()
+        row = self._prices.get(price)
+        if row is None:
+            row = self._prices[price] = self._row(price)
+        return row[currency]
+
+
+DEFAULT_RATES = ExchangeRates()
+PRICE_MATRIX = PriceMatrix(DEFAULT_RATES)
@@ -0,0 +1,103 @@
+"""
+Offline journal replay. Streams journal records through headless transaction engine
+on a fresh machine and reports steps whose outcome differs from the recorded one
+
+Machine is configured as the live one was, e.g. for journal of a server with accounts database and balanced change:
+    $ python -m package.replay ~/.vending-machine/journal.jsonl
+    $ python -m package.replay data/journal.jsonl --data-dir data --change-policy balanced
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+from .change import CHANGE_POLICIES
+from .engine import TransactionEngine
+from .journal import Journal, applyInit, changeToRecord
+from .model import Machine
+from .money import Money
+from .server import createMachine
+
+
+def replay(path: str, machine: Machine) -> Dict:
+    """
+    Replays journal on given machine
+    :param path: journal path
+    :param machine: machine replay is run on
+    :return: summary with number of records, speed and mismatches
+    """
+    engines: Dict[str, TransactionEngine] = {}
+    mismatches: List[Dict] = []
+    records = 0
+    started = time.perf_counter()
+
+    for record in Journal.read(path):
+        records += 1
+        recordType = record["t"]
+        if recordType == "init":
+            applyInit(machine, record)
+            continue
+        if recordType == "refill":
+            machine.stock.setLevel(tuple(record["slot"]), record["quantity"])
+            continue
+
+        engine = engines.get(record["s"])
+        if engine is None:
+            engine = engines[record["s"]] = TransactionEngine(machine.session())
+
+        if recordType == "select":
+            slot = record.get("slot")
+            engine.selectProduct(record["name"], Money(record["price"], "PLN"), tuple(slot) if slot else None)
+        elif recordType == "currency":
+            engine.chooseCurrency(record["currency"])
+        elif recordType == "payment":
+            engine.choosePaymentType(record["type"])
+        elif recordType == "card":
+            card = machine.findCard(record["account"]) if record["account"] is not None else None
+            account = machine.accounts.findAccount(record["account"]) if card is not None else None
+            engine.selectCard(account, card)
+        elif recordType == "coin":
+            engine.insertCoins([Money(record["value"], record["currency"])] * record.get("amount", 1))
+        elif recordType == "pay":
+            result = engine.pay()
+            replayed = {"error": result.error}
+            if "change" in record:
+                replayed["change"] = changeToRecord(engine.model.changeDenominations)
+            expected = {key: record[key] for key in replayed}
+            if replayed != expected:
+                mismatches.append({"record": records, "session": record["s"], "expected": expected,
+                                   "replayed": replayed})
+        elif recordType == "reset":
+            engine.reset()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "records": records,
+        "seconds": elapsed,
+        "recordsPerSecond": records / elapsed if elapsed else None,
+        "mismatches": mismatches
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay vending machine journal")
+    parser.add_argument("journal", help="journal path")
+    parser.add_argument("--data-dir", help="data directory of the machine, for its accounts database and catalog. "
+                                           "It isn't changed")
+    parser.add_argument("--change-policy", choices=list(CHANGE_POLICIES), default="fewest")
+    parser.add_argument("--change-fallback", type=json.loads,
+                        help='currencies which may be mixed into change, e.g. \'{"EUR": ["PLN"]}\'')
+    args = parser.parse_args()
+
+    machine = createMachine(os.path.expanduser(args.data_dir) if args.data_dir else None, args.change_policy,
+                            args.change_fallback, journal=False)
+    summary = replay(args.journal, machine)
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+    sys.exit(1 if summary["mismatches"] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""
+Network service for remote machine control. Line-delimited JSON over TCP or Unix socket:
+every request is one JSON object per line, every response too. Each connection is a separate
+customer session on shared machine.
+
+Request:  {"id": 1, "op": "select", "name": "Kawa"}
+Response: {"id": 1, "ok": true, "result": {"state": "currency", "paid": false, ...}}
+          {"id": 1, "ok": false, "error": "Action not allowed in state: IDLE"}
+
+Operations: products, select (name), currency (currency), payment (type), coin (value),
+card (account), pay, reset, state, inventory (currency, optional), metrics,
+refill (name, quantity, slot capacity if not given)
+
+Usage:
+    $ python -m package.server --port 8765
+    $ python -m package.server --unix /tmp/vending.sock --data-dir ~/.vending-machine
+"""
+import argparse
+import asyncio
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, List, Optional
+
+from .accounts import loadAccounts
+from .catalog import Catalog
+from .change import CHANGE_POLICIES, createChangeSolver
+from .engine import TransactionEngine, TransitionError, Result, State
+from .journal import Journal, recover
+from .metrics import METRICS, MetricsExporter
+from .model import ACCEPTED_COINS, Inventory, Machine
+from .money import Money
+from .stock import SLOT_CAPACITY, SlotStock
+
+# maximal length of one request line
+LINE_LIMIT = 64 * 1024
+
+
+def resultToDict(result: Result) -> Dict:
+    """
+    :param result: transaction step result
+    :return: JSON serializable result
+    """
+    product = result.product
+    return {
+        "state": result.state.value,
+        "error": result.error,
+        "product": {"name": product.name, "price": str(product.price), "currency": product.currency}
+        if product is not None else None,
+        "enteredAmount": str(result.enteredAmount),
+        "payed": str(result.payed) if result.payed is not None else None,
+        "change": result.change,
+        "exactChangeOnly": result.exactChangeOnly
+    }
+
+
+class Session:
+    """
+    Customer session of one client connection
+    """
+
+    def __init__(self, machine: Machine) -> None:
+        self.machine = machine
+        self.engine = TransactionEngine(machine.session())
+        self.operations: Dict[str, Callable[[Dict], object]] = {
+            "products": self.products,
+            "select": self.select,
+            "currency": lambda request: self.engine.chooseCurrency(request["currency"]),
+            "payment": lambda request: self.engine.choosePaymentType(request["type"]),
+            "coin": self.coin,
+            "card": self.card,
+            "pay": lambda request: self.engine.pay(),
+            "reset": lambda request: self.engine.reset(),
+            "state": lambda request: self.engine.result(),
+            "inventory": self.inventory,
+            "metrics": lambda request: dict(METRICS.snapshot(), changeCache=self.machine.changeCache.stats()),
+            "refill": self.refill
+        }
+
+    def products(self, request: Dict) -> list:
+        stock = self.machine.stock
+        return [{"id": item.id, "name": item.name, "price": str(item.price),
+                 "available": stock.available(item.position)} for item in self.machine.catalog]
+
+    def select(self, request: Dict) -> Result:
+        name = request["name"]
+        item = self.machine.catalog.byName(name)
+        if item is None:
+            raise ValueError(f"Unknown product: {name}")
+        return self.engine.selectProduct(item.name, item.price, item.position)
+
+    def refill(self, request: Dict) -> Dict:
+        name = request["name"]
+        item = self.machine.catalog.byName(name)
+        if item is None:
+            raise ValueError(f"Unknown product: {name}")
+        quantity = request.get("quantity")
+        if quantity is not None and (not isinstance(quantity, int) or isinstance(quantity, bool)):
+            raise ValueError(f"Invalid slot quantity: {quantity}")
+        self.machine.refillSlot(item.position, quantity)
+        return {"name": item.name, "available": self.machine.stock.available(item.position)}
+
+    def coin(self, request: Dict) -> Result:
+        try:
+            value = Decimal(request["value"])
+        except (InvalidOperation, TypeError):
+            raise ValueError(f"Invalid coin value: {request['value']}")
+        product = self.engine.model.selectedProduct
+        # coin slot takes only accepted coins of product currency, transaction state is checked by engine
+        if product is not None and not (value.is_finite() and
+                                        any(value == Decimal(coin) for coin in ACCEPTED_COINS[product.currency])):
+            raise ValueError(f"Coin not accepted: {request['value']} {product.currency}")
+        return self.engine.insertCoin(value)
+
+    def card(self, request: Dict) -> Result:
+        card = self.machine.findCard(request["account"])
+        if card is None:
+            raise ValueError(f"Unknown card: {request['account']}")
+        account = self.machine.accounts.findAccount(card.accountNumber)
+        return self.engine.selectCard(account, card)
+
+    def inventory(self, request: Dict) -> Dict:
+        snapshot = self.machine.inventory.snapshot()
+        if request.get("currency") is not None:
+            snapshot = {request["currency"]: snapshot[request["currency"]]}
+        return {currency: {str(Money(int(value), currency)): amount for value, amount in amounts.items()}
+                for currency, amounts in snapshot.items()}
+
+    def execute(self, request: Dict) -> Dict:
+        """
+        Executes one request
+        :param request: decoded request
+        :return: response
+        """
+        response = {"id": request.get("id")}
+        operation = self.operations.get(request.get("op"))
+        if operation is None:
+            response.update(ok=False, error=f"Unknown operation: {request.get('op')}")
+            return response
+        try:
+            result = operation(request)
+        except (TransitionError, ValueError, KeyError) as exception:
+            response.update(ok=False, error=str(exception) or type(exception).__name__)
+            return response
+
+        if isinstance(result, Result):
+            response.update(ok=result.ok, result=dict(resultToDict(result), paid=self.engine.paid))
+        else:
+            response.update(ok=True, result=result)
+        return response
+
+    def close(self) -> None:
+        """
+        Resets unfinished transaction, so its product isn't left reserved
+        :return: None
+        """
+        if self.engine.state != State.IDLE:
+            self.engine.reset()
+
+
+class Server:
+    """
+    Asyncio server of one machine. Connections are served concurrently on one event loop.
+    Payments write inventory file to disk, so they run in default executor to keep the loop responsive;
+    other steps are in-memory and run inline, journal is synced to disk on its own thread
+    """
+
+    def __init__(self, machine: Machine) -> None:
+        self.machine = machine
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, path: Optional[str] = None) -> None:
+        """
+        Starts listening
+        :param host: TCP host
+        :param port: TCP port, 0 picks a free one
+        :param path: Unix socket path, used instead of TCP if set
+        :return: None
+        """
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self.handle, path=path, limit=LINE_LIMIT)
+        else:
+            self._server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+
+    @property
+    def address(self):
+        """
+        :return: address of the first listening socket
+        """
+        return self._server.sockets[0].getsockname()
+
+    async def serve(self) -> None:
+        reloader = asyncio.create_task(self._reloadCatalog())
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            reloader.cancel()
+
+    async def _reloadCatalog(self, interval: float = 1.0) -> None:
+        """
+        Picks up catalog file changes
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.machine.catalog.reloadIfModified()
+            except (OSError, ValueError, KeyError):
+                # file is being written, next round will retry
+                pass
+
+    async def close(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serves one connection until client disconnects
+        """
+        loop = asyncio.get_running_loop()
+        session = Session(self.machine)
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    writer.write(b'{"id": null, "ok": false, "error": "Request too long"}\n')
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Request must be an object")
+                except ValueError as exception:
+                    response = {"id": None, "ok": False, "error": f"Invalid request: {exception}"}
+                else:
+                    if request.get("op") == "pay":
+                        response = await loop.run_in_executor(None, session.execute, request)
+                    else:
+                        response = session.execute(request)
+                writer.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            session.close()
+            self.connections -= 1
+            writer.close()
+
+
+def createMachine(dataDir: Optional[str], policy: str = "fewest",
+                  changeFallback: Optional[Dict[str, List[str]]] = None, slotCapacity: int = SLOT_CAPACITY,
+                  journal: bool = True) -> Machine:
+    """
+    :param dataDir: directory with inventory and journal, in-memory machine if None
+    :param policy: change policy, see package.change.CHANGE_POLICIES
+    :param changeFallback: currencies which may be mixed into change, see package.model.DEFAULT_CHANGE_FALLBACK
+    :param slotCapacity: products per slot of a new machine, journal of existing one keeps its stock
+    :param journal: recover machine from journal in data directory and write to it. Without journal
+    the machine works on a copy of accounts database, so data directory isn't changed (journal replay)
+    :return: machine
+    """
+    solver = createChangeSolver(policy)
+    stock = SlotStock(capacity=slotCapacity)
+    if dataDir is None:
+        return Machine(solver=solver, changeFallback=changeFallback, stock=stock)
+    machine = Machine(Inventory.load(os.path.join(dataDir, "inventory.json")), loadAccounts(dataDir, not journal),
+                      solver=solver, catalog=Catalog(path=os.path.join(dataDir, "catalog.json")),
+                      changeFallback=changeFallback, stock=stock)
+    if not journal:
+        return machine
+    journalPath = os.path.join(dataDir, "journal.jsonl")
+    recover(machine, journalPath)
+    machine.journal = Journal(journalPath, machine)
+    return machine
+
+
+async def serve(machine: Machine, host: str, port: int, path: Optional[str]) -> None:
+    server = Server(machine)
+    await server.start(host, port, path)
+    print(f"Listening on {server.address}", flush=True)
+    await server.serve()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vending machine network service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on Unix socket instead of TCP")
+    parser.add_argument("--data-dir", help="directory with inventory and journal, in-memory machine if not set")
+    parser.add_argument("--change-policy", choices=list(CHANGE_POLICIES), default="fewest")
+    parser.add_argument("--change-fallback", type=json.loads,
+                        help='currencies which may be mixed into change, e.g. \'{"EUR": ["PLN"]}\', \'{}\' disables it')
+    parser.add_argument("--slot-capacity", type=int, default=SLOT_CAPACITY, help="products per slot")
+    parser.add_argument("--metrics", action="store_true", help="record latency histograms and counters")
+    parser.add_argument("--metrics-file", help="Prometheus text file metrics are written to every 10 seconds")
+    args = parser.parse_args()
+
+    machine = createMachine(os.path.expanduser(args.data_dir) if args.data_dir else None, args.change_policy,
+                            args.change_fallback, args.slot_capacity)
+    exporter = None
+    if args.metrics or args.metrics_file:
+        METRICS.enabled = True
+        exporter = MetricsExporter(path=args.metrics_file) if args.metrics_file else None
+    try:
+        asyncio.run(serve(machine, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if machine.journal is not None:
+            machine.journal.close()
+        machine.ledger.close()
+        machine.accounts.close()
+        if exporter is not None:
+            exporter.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+Fleet simulator. Runs many independent headless machines with random customers,
+sharded across a process pool, and reports throughput, change failures, refill interval and inventory depletion
+
+Usage:
+    $ python -m package.simulator --machines 1000 --customers 500 --workers 8
+    $ python -m package.simulator --machines 1000 --customers 500 --compare-policies
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from dataclasses import dataclass, field, asdict, replace
+from multiprocessing import Pool
+from typing import Dict, List
+
+from .catalog import ITEMS
+from .change import CHANGE_POLICIES, createChangeSolver
+from .engine import TransactionEngine, State
+from .model import Machine, ACCEPTED_COINS
+from .money import Money
+from .stock import SLOT_CAPACITY, SlotStock
+
+
+@dataclass
+class SimulationConfig:
+    """
+    Simulation parameters. Mixes are relative weights
+    """
+    machines: int = 100
+    customers: int = 200
+    workers: int = 4
+    seed: int = 0
+    # number of customers between inventory samples
+    sampleEvery: int = 20
+    # change policy, see package.change.CHANGE_POLICIES
+    policy: str = "fewest"
+    # products per slot, sold out slots are refilled right away
+    slotCapacity: int = SLOT_CAPACITY
+    productMix: Dict[str, float] = field(default_factory=lambda: {item["name"]: 1.0 for item in ITEMS})
+    currencyMix: Dict[str, float] = field(default_factory=lambda: {"PLN": 6.0, "EUR": 3.0, "USD": 1.0})
+    paymentMix: Dict[str, float] = field(default_factory=lambda: {"cash": 7.0, "card": 3.0})
+    # weights of inserted coins per currency, coins are equally likely if currency is missing
+    coinMix: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+
+def choose(rng: random.Random, mix: Dict[str, float]) -> str:
+    return rng.choices(list(mix), weights=list(mix.values()))[0]
+
+
+def serveCustomer(rng: random.Random, machine: Machine, engine: TransactionEngine, config: SimulationConfig,
+                  prices: Dict[str, Money], stats: Dict[str, int]) -> None:
+    """
+    One customer buying one product
+    """
+    name = choose(rng, config.productMix)
+    currency = choose(rng, config.currencyMix)
+    if not engine.selectProduct(name, prices[name]).ok:
+        # customer leaves, empty slot is refilled
+        stats["soldOut"] += 1
+        machine.stock.setLevel(machine.catalog.byName(name).position, machine.stock.capacity)
+        engine.reset()
+        return
+    engine.chooseCurrency(currency)
+    result = engine.choosePaymentType(choose(rng, config.paymentMix))
+
+    if result.state == State.CASH:
+        stats["cash"] += 1
+        stats["exactChangeOnly"] += result.exactChangeOnly
+        mix = config.coinMix.get(currency) or dict.fromkeys(ACCEPTED_COINS[currency], 1.0)
+        while result.enteredAmount < result.product.price:
+            result = engine.insertCoin(Money.of(choose(rng, mix), currency))
+        result = engine.pay()
+        if not result.ok:
+            stats["changeFailures"] += 1
+        else:
+            stats["changeCoins"] += sum(denomination.amount for denomination in engine.model.changeDenominations)
+    else:
+        stats["card"] += 1
+        cards = [(account, card) for account in machine.accounts for card in account.cards
+                 if card.currency == currency]
+        if cards:
+            engine.selectCard(*rng.choice(cards))
+            result = engine.pay()
+        if not cards or not result.ok:
+            stats["cardFailures"] += 1
+
+    engine.reset()
+
+
+def simulateShard(shard: int, machines: int, config: SimulationConfig) -> Dict:
+    """
+    Simulates given number of machines one after another
+    :return: shard statistics and coin counts summed over machines, sampled every sampleEvery customers.
+    Refill interval of a machine is number of customers served before the first change failure,
+    which is when it needs a service visit
+    """
+    # stores are populated with module level random, so seed it too
+    random.seed(config.seed * 1000003 + shard)
+    rng = random.Random(config.seed * 1000003 + shard)
+    prices = {item["name"]: Money.of(item["price"], "PLN") for item in ITEMS}
+    stats = {"customers": 0, "cash": 0, "card": 0, "changeFailures": 0, "cardFailures": 0,
+             "changeCacheHits": 0, "changeCacheMisses": 0, "changeCoins": 0,
+             "exactChangeOnly": 0, "refillInterval": 0, "machinesNeedingRefill": 0, "soldOut": 0}
+    samples: List[Dict[str, Dict[str, int]]] = []
+
+    started = time.perf_counter()
+    for _ in range(machines):
+        machine = Machine(solver=createChangeSolver(config.policy), stock=SlotStock(capacity=config.slotCapacity))
+        engine = TransactionEngine(machine.session())
+        refillInterval = config.customers
+        for customer in range(config.customers):
+            if customer % config.sampleEvery == 0:
+                sample = customer // config.sampleEvery
+                snapshot = machine.inventory.snapshot()
+                if sample == len(samples):
+                    samples.append({currency: dict.fromkeys(amounts, 0) for currency, amounts in snapshot.items()})
+                for currency, amounts in snapshot.items():
+                    for value, amount in amounts.items():
+                        samples[sample][currency][value] += amount
+            failures = stats["changeFailures"]
+            serveCustomer(rng, machine, engine, config, prices, stats)
+            stats["customers"] += 1
+            if stats["changeFailures"] != failures and refillInterval == config.customers:
+                refillInterval = customer
+        stats["refillInterval"] += refillInterval
+        stats["machinesNeedingRefill"] += refillInterval < config.customers
+        stats["changeCacheHits"] += machine.changeCache.hits
+        stats["changeCacheMisses"] += machine.changeCache.misses
+
+    stats["seconds"] = time.perf_counter() - started
+    return {"stats": stats, "samples": samples}
+
+
+def simulate(config: SimulationConfig) -> Dict:
+    """
+    Runs simulation across a process pool
+    :return: aggregated report
+    """
+    workers = max(1, min(config.workers, config.machines))
+    shards = [config.machines // workers + (1 if shard < config.machines % workers else 0)
+              for shard in range(workers)]
+
+    started = time.perf_counter()
+    with Pool(workers) as pool:
+        results = pool.starmap(simulateShard, [(shard, machines, config)
+                                               for shard, machines in enumerate(shards) if machines])
+    elapsed = time.perf_counter() - started
+
+    totals = {key: sum(result["stats"][key] for result in results)
+              for key in ("customers", "cash", "card", "changeFailures", "cardFailures",
+                          "changeCacheHits", "changeCacheMisses", "changeCoins",
+                          "refillInterval", "machinesNeedingRefill", "soldOut")}
+    lookups = totals["changeCacheHits"] + totals["changeCacheMisses"]
+    depletion = []
+    for index in range(max(len(result["samples"]) for result in results)):
+        point = {"customer": index * config.sampleEvery}
+        for result in results:
+            for currency, amounts in result["samples"][index].items():
+                counts = point.setdefault(currency, {})
+                for value, amount in amounts.items():
+                    label = str(Money(int(value), currency))
+                    counts[label] = counts.get(label, 0) + amount
+        for currency in ("PLN", "USD", "EUR"):
+            point[currency] = {label: round(amount / config.machines, 2) for label, amount in point[currency].items()}
+        depletion.append(point)
+
+    return {
+        "config": asdict(config),
+        "seconds": elapsed,
+        "transactionsPerSecond": totals["customers"] / elapsed,
+        **totals,
+        "changeFailureRate": totals["changeFailures"] / totals["cash"] if totals["cash"] else 0.0,
+        "cardFailureRate": totals["cardFailures"] / totals["card"] if totals["card"] else 0.0,
+        # customers who found their product sold out
+        "soldOutRate": totals["soldOut"] / totals["customers"] if totals["customers"] else 0.0,
+        "changeCacheHitRate": totals["changeCacheHits"] / lookups if lookups else 0.0,
+        # customers served before the first change failure, machines which never failed count as config.customers
+        "meanRefillInterval": totals["refillInterval"] / config.machines,
+        "coinsPerChange": totals["changeCoins"] / (totals["cash"] - totals["changeFailures"])
+        if totals["cash"] > totals["changeFailures"] else 0.0,
+        # average number of coins per denomination left in a machine, sampled every sampleEvery customers
+        "inventoryDepletion": depletion
+    }
+
+
+def comparePolicies(config: SimulationConfig) -> Dict:
+    """
+    Runs the same simulation with every change policy
+    :return: refill interval, change failures and coins per change of every policy,
+     refill interval improvement is relative to 'fewest' policy
+    """
+    reports = {policy: simulate(replace(config, policy=policy)) for policy in CHANGE_POLICIES}
+    baseline = reports["fewest"]["meanRefillInterval"]
+    return {
+        "config": asdict(config),
+        "policies": {
+            policy: {
+                "meanRefillInterval": report["meanRefillInterval"],
+                "refillIntervalImprovement": report["meanRefillInterval"] / baseline - 1.0 if baseline else 0.0,
+                "machinesNeedingRefill": report["machinesNeedingRefill"],
+                "changeFailureRate": report["changeFailureRate"],
+                "coinsPerChange": report["coinsPerChange"],
+                "transactionsPerSecond": report["transactionsPerSecond"]
+            }
+            for policy, report in reports.items()
+        }
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vending machine fleet simulator")
+    parser.add_argument("--machines", type=int, default=100)
+    parser.add_argument("--customers", type=int, default=200, help="customers per machine")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample-every", type=int, default=20, help="customers between inventory samples")
+    parser.add_argument("--currency-mix", type=json.loads, help='e.g. \'{"PLN": 1, "EUR": 1}\'')
+    parser.add_argument("--payment-mix", type=json.loads, help='e.g. \'{"cash": 9, "card": 1}\'')
+    parser.add_argument("--product-mix", type=json.loads, help='e.g. \'{"Kawa": 5, "Woda": 1}\'')
+    parser.add_argument("--coin-mix", type=json.loads, help='e.g. \'{"PLN": {"5.00": 4, "2.00": 1}}\'')
+    parser.add_argument("--slot-capacity", type=int, default=SLOT_CAPACITY, help="products per slot")
+    parser.add_argument("--policy", choices=list(CHANGE_POLICIES), default="fewest", help="change policy")
+    parser.add_argument("--compare-policies", action="store_true",
+                        help="run simulation with every change policy and report refill intervals")
+    args = parser.parse_args()
+
+    config = SimulationConfig(machines=args.machines, customers=args.customers, workers=args.workers,
+                              seed=args.seed, sampleEvery=args.sample_every, policy=args.policy,
+                              slotCapacity=args.slot_capacity)
+    if args.currency_mix:
+        config.currencyMix = args.currency_mix
+    if args.payment_mix:
+        config.paymentMix = args.payment_mix
+    if args.product_mix:
+        config.productMix = args.product_mix
+    if args.coin_mix:
+        config.coinMix = args.coin_mix
+
+    report = comparePolicies(config) if args.compare_policies else simulate(config)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+# Products every slot holds when it isn't set otherwise
+SLOT_CAPACITY = 10
+
+Position = Tuple[int, int]
+
+
+@dataclass
+class Slot:
+    """
+    Product slot of the machine, at products grid position.
+    quantity - products in the slot, including reserved ones
+    reserved - products selected by customers who haven't paid yet
+    """
+    position: Position
+    quantity: int
+    reserved: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def available(self) -> int:
+        return self.quantity - self.reserved
+
+
+class SlotStock:
+    """
+    Stock levels of product slots, keyed by catalog item positions.
+
+    Product is reserved when it's selected, taken out of the slot when it's paid for and
+    released when transaction is reset without payment, so two customers can't buy the last item.
+    Every slot has its own lock. Positions of slots without available products are kept in sold-out index,
+    a frozen set replaced on change, which can be checked without any lock.
+    Slots are created on first use, so positions added to the catalog later get SLOT_CAPACITY products
+    """
+
+    def __init__(self, levels: Optional[Dict[Position, int]] = None, capacity: int = SLOT_CAPACITY) -> None:
+        self.capacity = capacity
+        self.slots: Dict[Position, Slot] = {}
+        self.soldOut: FrozenSet[Position] = frozenset()
+        # called with sold-out index after it changes, from the thread which changed it
+        self.listeners: List[Callable[[FrozenSet[Position]], None]] = []
+        self._registerLock = threading.Lock()
+        self._indexLock = threading.Lock()
+        for position, quantity in (levels or {}).items():
+            self.setLevel(position, quantity)
+
+    def slot(self, position: Position) -> Slot:
+        slot = self.slots.get(position)
+        if slot is None:
+            with self._registerLock:
+                slot = self.slots.setdefault(position, Slot(position, self.capacity))
+        return slot
+
+    def isSoldOut(self, position: Position) -> bool:
+        return position in self.soldOut
+
+    def available(self, position: Position) -> int:
+        slot = self.slot(position)
+        with slot.lock:
+            return slot.available
+
+    def _index(self, slot: Slot) -> None:
+        """
+        Updates sold-out index with slot state, called under slot lock
+        """
+        soldOut = slot.available <= 0
+        if soldOut == (slot.position in self.soldOut):
+            return
+        with self._indexLock:
+            self.soldOut = self.soldOut | {slot.position} if soldOut else self.soldOut - {slot.position}
+            index = self.soldOut
+        for listener in self.listeners:
+            listener(index)
+
+    def reserve(self, position: Position) -> bool:
+        """
+        Reserves one product of the slot
+        :param position: slot position
+        :return: False if the slot is sold out
+        """
+        if position in self.soldOut:
+            return False
+        slot = self.slot(position)
+        with slot.lock:
+            if slot.available <= 0:
+                return False
+            slot.reserved += 1
+            self._index(slot)
+        return True
+
+    def commit(self, position: Position) -> None:
+        """
+        Takes reserved product out of the slot
+        :param position: slot position
+        :return: None
+        """
+        slot = self.slot(position)
+        with slot.lock:
+            if slot.reserved <= 0:
+                raise ValueError(f"No product reserved in slot {position}")
+            slot.reserved -= 1
+            slot.quantity -= 1
+
+    def release(self, position: Position) -> None:
+        """
+        Returns reserved product to the slot
+        :param position: slot position
+        :return: None
+        """
+        slot = self.slot(position)
+        with slot.lock:
+            if slot.reserved <= 0:
+                raise ValueError(f"No product reserved in slot {position}")
+            slot.reserved -= 1
+            self._index(slot)
+
+    def remove(self, position: Position, quantity: int = 1) -> None:
+        """
+        Takes products out of the slot without reservation, e.g. sales replayed from journal
+        :param position: slot position
+        :param quantity: number of products
+        :return: None
+        """
+        slot = self.slot(position)
+        with slot.lock:
+            slot.quantity = max(slot.quantity - quantity, 0)
+            self._index(slot)
+
+    def setLevel(self, position: Position, quantity: int) -> None:
+        """
+        Sets number of products in the slot, e.g. after refill. Reservations are kept
+        :param position: slot position
+        :param quantity: number of products, including reserved ones
+        :return: None
+        """
+        slot = self.slot(position)
+        with slot.lock:
+            slot.quantity = max(quantity, slot.reserved)
+            self._index(slot)
+
+    def snapshot(self) -> List[List[int]]:
+        """
+        :return: [row, column, quantity] of every slot, JSON serializable
+        """
+        levels = []
+        for position, slot in list(self.slots.items()):
+            with slot.lock:
+                levels.append([*position, slot.quantity])
+        return levels
+
+    def setLevels(self, levels: List[List[int]]) -> None:
+        """
+        Sets slot levels from snapshot
+        :param levels: [row, column, quantity] lists
+        :return: None
+        """
+        for row, column, quantity in levels:
+            self.setLevel((row, column), quantity)
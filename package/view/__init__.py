@@ -1,7 +1,12 @@
+from typing import FrozenSet, List, Tuple
+
 from PyQt5.QtWidgets import QMainWindow, QHBoxLayout, QWidget
 
+from package.model import Denomination
+
 from .display import MainDisplay
 from .products import ProductsGrid
+from .updates import UpdateScheduler
 
 
 class Window(QMainWindow):
@@ -15,6 +20,11 @@ class Window(QMainWindow):
         self.setWindowTitle("Vending Machine")
         self.setFixedSize(800, 600)
 
+        # display, button and table changes are applied once per event loop turn
+        self.updates = UpdateScheduler()
+        self._buttonsEnabled = True
+        self._soldOut: FrozenSet[Tuple[int, int]] = frozenset()
+
         self.generalLayout = QHBoxLayout()
         self._centralWidget = QWidget(self)
         self.setCentralWidget(self._centralWidget)
@@ -34,15 +44,7 @@ class Window(QMainWindow):
         :param menu: name
         :return: None
         """
-        menus = {
-            "empty": 0,
-            "currency": 1,
-            "paymentType": 2,
-            "cash": 3,
-            "cashResult": 4,
-            "card": 5,
-        }
-        self.displayMenu.stack.setCurrentIndex(menus[menu])
+        self.displayMenu.stack.setCurrentWidget(self.displayMenu.menu(menu))
 
     def setDisplayText(self, text: str) -> None:
         """
@@ -50,8 +52,7 @@ class Window(QMainWindow):
         :param text: text to display
         :return: None
         """
-        self.displayMenu.displayScreen.setPlainText(text)
-        self.displayMenu.displayScreen.repaint()
+        self.updates.setPlainText(self.displayMenu.displayScreen, text)
 
     def setButtonsEnabled(self, enabled: bool) -> None:
         """
@@ -59,26 +60,46 @@ class Window(QMainWindow):
         :param enabled:
         :return: None
         """
-        for button in self.productsMenu.productButtons:
-            button.setEnabled(enabled)
-            button.repaint()
+        self._buttonsEnabled = enabled
+        if enabled:
+            self._scheduleProductButtons()
+        else:
+            # disabled right away, so a second click can't select another product before the next flush
+            self.updates.cancel(self, "productButtons")
+            self.productsMenu.setButtonsEnabled(False, self._soldOut)
+
+    def setSoldOut(self, positions: FrozenSet[Tuple[int, int]]) -> None:
+        """
+        Disables buttons of sold out slots
+        :param positions: positions of all sold out slots
+        :return: None
+        """
+        self._soldOut = positions
+        self._scheduleProductButtons()
+
+    def _scheduleProductButtons(self) -> None:
+        # enabling and sold out slots are applied to all buttons together, in one update
+        enabled, soldOut = self._buttonsEnabled, self._soldOut
+        self.updates.schedule(self, "productButtons",
+                              lambda: self.productsMenu.setButtonsEnabled(enabled, soldOut))
 
-    def updateChangeTable(self, changeTableValues: dict) -> None:
+    def updateChangeTable(self, change: List[Denomination]) -> None:
         """
-        Updates change table with given values
-        :param changeTableValues: columns and rows
+        Shows change in change table
+        :param change: list of denominations
         :return: None
         """
-        self.displayMenu.cashPaymentResultMenu.changeDialog.changeTable.updateTable(changeTableValues)
+        changeTable = self.displayMenu.cashPaymentResultMenu.changeDialog.changeTable
+        self.updates.schedule(changeTable, "table", lambda: changeTable.updateTable(change))
 
-    def updateDenominationsTable(self, denominationsTableValues: dict) -> None:
+    def updateDenominationsTable(self, denominations: List[Denomination]) -> None:
         """
-        Updates denominations table with given values
-        :param denominationsTableValues: columns and rows
+        Shows denominations available in the store
+        :param denominations: live list of store denominations
         :return: None
         """
-        self.displayMenu.cashPaymentResultMenu.denominationsDialog.denominationsTable.updateTable(
-            denominationsTableValues)
+        denominationsTable = self.displayMenu.cashPaymentResultMenu.denominationsDialog.denominationsTable
+        self.updates.schedule(denominationsTable, "table", lambda: denominationsTable.updateTable(denominations))
 
     def resetUI(self) -> None:
         """
@@ -86,7 +107,9 @@ class Window(QMainWindow):
         :return: None
         """
         self.setButtonsEnabled(True)
-        self.displayMenu.cardPaymentMenu.buttonPayment.setEnabled(True)
-        self.displayMenu.cardPaymentMenu.buttonPayment.repaint()
+        cardPaymentMenu = self.displayMenu.menus.get("card")
+        if cardPaymentMenu is not None:
+            self.updates.setEnabled(cardPaymentMenu.buttonPayment, True)
+            cardPaymentMenu.cardNumberInput.clear()
         self.switchMenu("empty")
         self.setDisplayText("Wybierz produkt")
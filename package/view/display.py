@@ -1,14 +1,20 @@
-import os
+from typing import Callable, Dict, List, Tuple
 
-from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
 from PyQt5.QtGui import QFont, QIcon
 from PyQt5.QtWidgets import QVBoxLayout, QStackedLayout, QWidget, QPlainTextEdit, QHBoxLayout, QPushButton, QLabel, \
-    QGridLayout, QTableWidget, QTableWidgetItem, QHeaderView, QDialog, QComboBox
+    QGridLayout, QTableView, QHeaderView, QDialog, QComboBox, QLineEdit
 
-from package import BASE_DIR, resource_path
+from package.model import Denomination
+from .images import PAYMENT_ICON_SIZE, images
 
 
 class MainDisplay(QVBoxLayout):
+    """
+    Display screen with stack of menus below it.
+    Menus are created when they are shown (or accessed) for the first time,
+    listeners registered with onMenuCreated are called right after that
+    """
 
     def __init__(self) -> None:
         super().__init__()
@@ -20,26 +26,73 @@ class MainDisplay(QVBoxLayout):
         self.displayScreen = DisplayUI()
         self.addWidget(self.displayScreen)
 
-        # Initialization of menu
+        # Menu classes by name, names match transaction states
+        self.menuClasses = {
+            "empty": QWidget,
+            "currency": CurrencyUI,
+            "paymentType": PaymentTypeUI,
+            "cash": CashPaymentUI,
+            "cashResult": CashResultUI,
+            "card": CardPaymentUI
+        }
+        self.menus: Dict[str, QWidget] = {}
+        self._listeners: Dict[str, List[Callable[[], None]]] = {}
+
         self.stack = QStackedLayout()
-        self.emptyMenu = QWidget()
-        self.currencySelectMenu = CurrencyUI()
-        self.paymentTypeMenu = PaymentTypeUI()
-        self.cashPaymentMenu = CashPaymentUI()
-        self.cashPaymentResultMenu = CashResultUI()
-        self.cardPaymentMenu = CardPaymentUI()
-
-        # Adding menu to stack layout
-        self.stack.addWidget(self.emptyMenu)
-        self.stack.addWidget(self.currencySelectMenu)
-        self.stack.addWidget(self.paymentTypeMenu)
-        self.stack.addWidget(self.cashPaymentMenu)
-        self.stack.addWidget(self.cashPaymentResultMenu)
-        self.stack.addWidget(self.cardPaymentMenu)
+        self.menu("empty")
 
         # Adding stack layout to general layout
         self.addLayout(self.stack)
 
+    def menu(self, name: str) -> QWidget:
+        """
+        :param name: menu name
+        :return: menu, created if it doesn't exist yet
+        """
+        menu = self.menus.get(name)
+        if menu is None:
+            menu = self.menus[name] = self.menuClasses[name]()
+            self.stack.addWidget(menu)
+            for listener in self._listeners.pop(name, []):
+                listener()
+        return menu
+
+    def onMenuCreated(self, name: str, listener: Callable[[], None]) -> None:
+        """
+        Registers listener called once menu is created, or right away if it already is
+        :param name: menu name
+        :param listener: callable without arguments
+        :return: None
+        """
+        if name in self.menus:
+            listener()
+        else:
+            self._listeners.setdefault(name, []).append(listener)
+
+    @property
+    def emptyMenu(self) -> QWidget:
+        return self.menu("empty")
+
+    @property
+    def currencySelectMenu(self) -> "CurrencyUI":
+        return self.menu("currency")
+
+    @property
+    def paymentTypeMenu(self) -> "PaymentTypeUI":
+        return self.menu("paymentType")
+
+    @property
+    def cashPaymentMenu(self) -> "CashPaymentUI":
+        return self.menu("cash")
+
+    @property
+    def cashPaymentResultMenu(self) -> "CashResultUI":
+        return self.menu("cashResult")
+
+    @property
+    def cardPaymentMenu(self) -> "CardPaymentUI":
+        return self.menu("card")
+
 
 class DisplayUI(QPlainTextEdit):
 
@@ -152,9 +205,9 @@ class CashResultUI(QWidget):
         self.buttonAvaliableDenomninations = QPushButton("Pokaż dostępny nominały")
         self.buttonReset = QPushButton("Wróc do początku")
 
-        # dialogs
-        self.changeDialog = ChangeDialog()
-        self.denominationsDialog = AvailableDenominationsDialog()
+        # dialogs, created when they are shown first time
+        self._changeDialog = None
+        self._denominationsDialog = None
 
         self.layout.addWidget(self.buttonChange)
         self.layout.addWidget(self.buttonAvaliableDenomninations)
@@ -162,45 +215,104 @@ class CashResultUI(QWidget):
 
         self.setLayout(self.layout)
 
+    @property
+    def changeDialog(self) -> "ChangeDialog":
+        if self._changeDialog is None:
+            self._changeDialog = ChangeDialog()
+        return self._changeDialog
+
+    @property
+    def denominationsDialog(self) -> "AvailableDenominationsDialog":
+        if self._denominationsDialog is None:
+            self._denominationsDialog = AvailableDenominationsDialog()
+        return self._denominationsDialog
+
 
 class ChangeDialog(QDialog):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Tablica reszty")
-        self.changeTable = TableView({}, 8, 3)
+        self.changeTable = TableView()
 
 
 class AvailableDenominationsDialog(QDialog):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Tablica nominałów")
-        self.denominationsTable = TableView({}, 8, 3)
+        self.denominationsTable = TableView()
 
 
-class TableView(QTableWidget):
-    def __init__(self, data, *args):
-        QTableWidget.__init__(self, *args)
-        self.data = data
-        self.setData()
+class DenominationTableModel(QAbstractTableModel):
+    """
+    Table model over live list of denominations (change or store content).
+    Cells are formatted only when view asks for them, and refresh reports only rows that have changed
+    """
+
+    headers = ["value", "amount", "currency"]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.denominations: List[Denomination] = []
+        # (value, amount, currency) of every row as last shown
+        self._rows: List[Tuple] = []
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.denominations)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        denomination = self.denominations[index.row()]
+        column = index.column()
+        if column == 0:
+            return str(denomination.value)
+        if column == 1:
+            return str(denomination.amount)
+        return denomination.currency
+
+    def headerData(self, section: int, orientation: int, role: int = Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def setDenominations(self, denominations: List[Denomination]) -> None:
+        """
+        Shows given denominations. If number of rows is the same, only changed rows are reported
+        :param denominations: denominations, the list is read directly, not copied
+        :return: None
+        """
+        rows = [(denomination.value, denomination.amount, denomination.currency) for denomination in denominations]
+        if len(rows) != len(self._rows):
+            self.beginResetModel()
+            self.denominations = denominations
+            self._rows = rows
+            self.endResetModel()
+            return
+
+        self.denominations = denominations
+        lastColumn = len(self.headers) - 1
+        for row, (old, new) in enumerate(zip(self._rows, rows)):
+            if old != new:
+                self.dataChanged.emit(self.index(row, 0), self.index(row, lastColumn), [Qt.DisplayRole])
+        self._rows = rows
+
+
+class TableView(QTableView):
+    def __init__(self):
+        super().__init__()
+        self.tableModel = DenominationTableModel()
+        self.setModel(self.tableModel)
         self.setMinimumHeight(300)
         self.setMinimumWidth(400)
         self.setVisible(False)
+        self.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
 
-    def updateTable(self, data):
-        self.data = data
-        self.setData()
+    def updateTable(self, denominations: List[Denomination]) -> None:
+        self.tableModel.setDenominations(denominations)
         self.setVisible(True)
-        header = self.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.Stretch)
-
-    def setData(self):
-        horHeaders = []
-        for n, key in enumerate(self.data.keys()):
-            horHeaders.append(key)
-            for m, item in enumerate(self.data[key]):
-                newitem = QTableWidgetItem(item)
-                self.setItem(m, n, newitem)
-        self.setHorizontalHeaderLabels(horHeaders)
 
 
 class CardPaymentUI(QWidget):
@@ -209,6 +321,9 @@ class CardPaymentUI(QWidget):
         self.layout = QVBoxLayout()
         self.layout.setAlignment(Qt.AlignTop)
 
+        self.cardNumberInput = QLineEdit()
+        self.cardNumberInput.setPlaceholderText("Numer karty")
+
         self.selectLayout = QHBoxLayout()
         self.accountSelect = QComboBox()
         self.cardSelect = QComboBox()
@@ -219,10 +334,12 @@ class CardPaymentUI(QWidget):
         self.buttonPayment = QPushButton()
         self.buttonPayment.setMinimumHeight(200)
         self.buttonPayment.setMaximumWidth(200)
-        self.buttonPayment.setIcon(QIcon(resource_path('package/assets/utilities/card-payment.png')))
-        self.buttonPayment.setIconSize(QSize(200, 200))
+        self.buttonPayment.setIconSize(PAYMENT_ICON_SIZE)
+        images().request('package/assets/utilities/card-payment.png', PAYMENT_ICON_SIZE,
+                         lambda pixmap: self.buttonPayment.setIcon(QIcon(pixmap)))
         self.buttonReset = QPushButton("Wróc do początku")
 
+        self.layout.addWidget(self.cardNumberInput)
         self.layout.addLayout(self.selectLayout)
         self.layout.addWidget(self.buttonPayment)
         self.layout.addWidget(self.buttonReset)
@@ -237,3 +354,15 @@ class CardPaymentUI(QWidget):
         self.cardSelect.clear()
         for card in account.cards:
             self.cardSelect.addItem(f"{card.accountNumber} {card.balance}{card.currency}", card)
+
+    def showAccount(self, account, card):
+        """
+        Selects given account and card, account is added to the list if it isn't there yet
+        """
+        index = next((index for index in range(self.accountSelect.count())
+                      if self.accountSelect.itemData(index) is account), None)
+        if index is None:
+            self.accountSelect.addItem(account.fullname, account)
+            index = self.accountSelect.count() - 1
+        self.accountSelect.setCurrentIndex(index)
+        self.cardSelect.setCurrentIndex(account.cards.index(card))
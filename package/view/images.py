@@ -0,0 +1,171 @@
+import hashlib
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PyQt5.QtCore import QCoreApplication, QObject, QRunnable, QSize, QThreadPool, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QPixmap, QPixmapCache
+
+from package import DATA_DIR, resource_path
+
+# Sizes images are shown at
+PRODUCT_ICON_SIZE = QSize(70, 70)
+PAYMENT_ICON_SIZE = QSize(200, 200)
+
+# Decoded pixmaps kept in memory, in kilobytes
+PIXMAP_CACHE_LIMIT = 20 * 1024
+
+
+class ImageLoader(QObject):
+    """
+    Loads images scaled to the size they are shown at.
+
+    Scaled images are kept in QPixmapCache and saved as PNG thumbnails in disk cache,
+    keyed by hash of source file content, so next start doesn't decode full size images at all.
+    Images missing in memory cache are decoded on worker threads, callbacks are called on GUI thread
+    """
+
+    loaded = pyqtSignal(str, QImage)
+
+    def __init__(self, cacheDir: Optional[str] = os.path.join(DATA_DIR, "thumbnails"), workers: int = 2) -> None:
+        super().__init__()
+        self.cacheDir = cacheDir
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(workers)
+        self._waiting: Dict[str, List[Callable[[QPixmap], None]]] = {}
+        # (path, modification time) -> content hash
+        self._hashes: Dict[Tuple[str, float], str] = {}
+        self.loaded.connect(self._onLoaded)
+        # worker still decoding while application is torn down would crash it
+        application = QCoreApplication.instance()
+        if application is not None:
+            application.aboutToQuit.connect(self.shutdown)
+        QPixmapCache.setCacheLimit(max(QPixmapCache.cacheLimit(), PIXMAP_CACHE_LIMIT))
+
+    @staticmethod
+    def key(path: str, size: QSize) -> str:
+        return f"{path}@{size.width()}x{size.height()}"
+
+    def _hash(self, path: str) -> str:
+        stamp = (path, os.path.getmtime(path))
+        if stamp not in self._hashes:
+            with open(path, "rb") as file:
+                self._hashes[stamp] = hashlib.sha1(file.read()).hexdigest()
+        return self._hashes[stamp]
+
+    def loadImage(self, path: str, size: QSize) -> QImage:
+        """
+        Loads scaled image from disk cache or decodes and scales source file. Safe to call from any thread
+        :param path: image path relative to resources
+        :param size: target size, aspect ratio is kept
+        :return: image, null image if file can't be read
+        """
+        source = resource_path(path)
+        if not os.path.exists(source):
+            return QImage()
+
+        thumbnail = None
+        if self.cacheDir is not None:
+            thumbnail = os.path.join(self.cacheDir, f"{self._hash(source)}-{size.width()}x{size.height()}.png")
+            if os.path.exists(thumbnail):
+                image = QImage(thumbnail)
+                if not image.isNull():
+                    return image
+
+        reader = QImageReader(source)
+        original = reader.size()
+        if original.isValid():
+            # lets JPEG decoder skip detail that would be scaled away anyway
+            reader.setScaledSize(original.scaled(size, Qt.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            return image
+
+        if thumbnail is not None:
+            os.makedirs(self.cacheDir, exist_ok=True)
+            temporary = f"{thumbnail}.{os.getpid()}.tmp"
+            if image.save(temporary, "PNG"):
+                os.replace(temporary, thumbnail)
+        return image
+
+    def pixmap(self, path: str, size: QSize) -> QPixmap:
+        """
+        Loads pixmap synchronously
+        :param path: image path relative to resources
+        :param size: target size
+        :return: pixmap
+        """
+        key = self.key(path, size)
+        pixmap = QPixmapCache.find(key)
+        if pixmap is None or pixmap.isNull():
+            pixmap = QPixmap.fromImage(self.loadImage(path, size))
+            QPixmapCache.insert(key, pixmap)
+        return pixmap
+
+    def request(self, path: str, size: QSize, callback: Callable[[QPixmap], None]) -> None:
+        """
+        Loads pixmap in background. Callback is called right away if pixmap is already in memory
+        :param path: image path relative to resources
+        :param size: target size
+        :param callback: called with pixmap on GUI thread
+        :return: None
+        """
+        key = self.key(path, size)
+        pixmap = QPixmapCache.find(key)
+        if pixmap is not None and not pixmap.isNull():
+            callback(pixmap)
+            return
+
+        # same image requested by many widgets is decoded once
+        if key in self._waiting:
+            self._waiting[key].append(callback)
+            return
+        self._waiting[key] = [callback]
+        self.pool.start(_LoadTask(self, key, path, size))
+
+    def _onLoaded(self, key: str, image: QImage) -> None:
+        pixmap = QPixmap.fromImage(image)
+        QPixmapCache.insert(key, pixmap)
+        for callback in self._waiting.pop(key, []):
+            callback(pixmap)
+
+    def shutdown(self) -> None:
+        """
+        Drops queued loads and waits for running ones
+        :return: None
+        """
+        self.pool.clear()
+        self.pool.waitForDone()
+        self._waiting.clear()
+
+    def waitForDone(self) -> None:
+        """
+        Waits for background loads. Callbacks are called once GUI thread processes events
+        :return: None
+        """
+        self.pool.waitForDone()
+
+
+class _LoadTask(QRunnable):
+
+    def __init__(self, loader: ImageLoader, key: str, path: str, size: QSize) -> None:
+        super().__init__()
+        self.loader = loader
+        self.key = key
+        self.path = path
+        self.size = size
+
+    def run(self) -> None:
+        self.loader.loaded.emit(self.key, self.loader.loadImage(self.path, self.size))
+
+
+_loader: Optional[ImageLoader] = None
+
+
+def images() -> ImageLoader:
+    """
+    :return: image loader shared by all views, created on first use
+    """
+    global _loader
+    if _loader is None:
+        _loader = ImageLoader()
+    return _loader
@@ -1,71 +1,21 @@
-import os
-from decimal import Decimal
+from functools import partial
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
-from PyQt5.QtCore import Qt, QSize
-from PyQt5.QtGui import QIcon
+from PyQt5 import sip
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QIcon, QPixmap
 from PyQt5.QtWidgets import QGridLayout, QLabel, QPushButton
 
-from package import BASE_DIR, resource_path
-from package.model import Product
+from package.catalog import Catalog, CatalogChange, CatalogItem
+from .images import PRODUCT_ICON_SIZE, images
 
 
 class ProductsGrid(QGridLayout):
-    items = [
-        {
-            "position": (1, 1),
-            "name": "Kawa",
-            "image_url": "package/assets/products/kawa.jpg",
-            "price": Decimal("2.00")
-        },
-        {
-            "position": (2, 1),
-            "name": "Herbata",
-            "image_url": "package/assets/products/tea.jpg",
-            "price": Decimal("2.00")
-        },
-        {
-            "position": (3, 1),
-            "name": "Woda",
-            "image_url": "package/assets/products/water.jpeg",
-            "price": Decimal("1.00")
-        },
-        {
-            "position": (1, 2),
-            "name": "Snickers",
-            "image_url": "package/assets/products/snickers.jpeg",
-            "price": Decimal("4.00")
-        },
-        {
-            "position": (2, 2),
-            "name": "Twix",
-            "image_url": "package/assets/products/twix.png",
-            "price": Decimal("4.00")
-        },
-        {
-            "position": (3, 2),
-            "name": "Kitkat",
-            "image_url": "package/assets/products/kitkat.png",
-            "price": Decimal("4.00")
-        },
-        {
-            "position": (1, 3),
-            "name": "Cola",
-            "image_url": "package/assets/products/cola.jpeg",
-            "price": Decimal("5.00")
-        },
-        {
-            "position": (2, 3),
-            "name": "Sok",
-            "image_url": "package/assets/products/sok.jpg",
-            "price": Decimal("5.00")
-        },
-        {
-            "position": (3, 3),
-            "name": "Czipsy",
-            "image_url": "package/assets/products/lays.jpeg",
-            "price": Decimal("3.00")
-        }
-    ]
+    """
+    Grid of product buttons, one button per catalog item.
+    Catalog changes are applied to existing buttons, only added and removed items create or delete widgets.
+    Buttons of sold out slots stay disabled
+    """
 
     def __init__(self) -> None:
         super().__init__()
@@ -74,21 +24,95 @@ class ProductsGrid(QGridLayout):
         label.setAlignment(Qt.AlignHCenter)
         self.addWidget(label, 0, 0, 1, 4)
 
-        self.productButtons = []
-        self.buttonsUi()
+        self.buttons: Dict[str, ProductButton] = {}
+        self.buttonsEnabled = True
+        self.soldOut: FrozenSet[Tuple[int, int]] = frozenset()
 
-    def buttonsUi(self) -> None:
-        for product in self.items:
-            buttonItem = ProductButton(product["name"], product["price"], product["image_url"])
-            self.productButtons.append(buttonItem)
-            self.addWidget(buttonItem, product["position"][0], product["position"][1])
+    @property
+    def productButtons(self) -> List["ProductButton"]:
+        return list(self.buttons.values())
+
+    def showCatalog(self, catalog: Catalog) -> List["ProductButton"]:
+        """
+        Creates buttons for all catalog items
+        :param catalog: catalog
+        :return: created buttons
+        """
+        return self.applyChange(catalog, CatalogChange(added=list(catalog.items)))
+
+    def applyChange(self, catalog: Catalog, change: CatalogChange) -> List["ProductButton"]:
+        """
+        Updates grid after catalog reload
+        :param catalog: reloaded catalog
+        :param change: what has changed
+        :return: created buttons
+        """
+        for itemId in change.removed:
+            button = self.buttons.pop(itemId)
+            self.removeWidget(button)
+            button.deleteLater()
+
+        for itemId in change.updated:
+            button = self.buttons[itemId]
+            item = catalog.get(itemId)
+            if item.position != button.item.position:
+                self.removeWidget(button)
+                self.addWidget(button, *item.position)
+            button.setItem(item)
+            button.setEnabled(self._isEnabled(button))
+
+        created = []
+        for itemId in change.added:
+            button = ProductButton(catalog.get(itemId))
+            button.setEnabled(self._isEnabled(button))
+            self.buttons[itemId] = button
+            self.addWidget(button, *button.item.position)
+            created.append(button)
+        return created
+
+    def _isEnabled(self, button: "ProductButton") -> bool:
+        return self.buttonsEnabled and button.item.position not in self.soldOut
+
+    def setButtonsEnabled(self, enabled: bool, soldOut: Optional[FrozenSet[Tuple[int, int]]] = None) -> None:
+        """
+        :param enabled: False disables all buttons
+        :param soldOut: positions of sold out slots, unchanged if None
+        :return: None
+        """
+        self.buttonsEnabled = enabled
+        if soldOut is not None:
+            self.soldOut = soldOut
+        for button in self.buttons.values():
+            button.setEnabled(self._isEnabled(button))
 
 
 class ProductButton(QPushButton):
 
-    def __init__(self, name: str, price: Decimal, imageUrl: str) -> None:
+    def __init__(self, item: CatalogItem) -> None:
         super().__init__()
         self.setFixedSize(80, 80)
-        self.setIcon(QIcon(resource_path(imageUrl)))
-        self.setIconSize(QSize(70, 70))
-        self.product = Product(name, price)
+        self.setIconSize(PRODUCT_ICON_SIZE)
+        self.item = None
+        self.setItem(item)
+
+    @property
+    def itemId(self) -> str:
+        return self.item.id
+
+    def setItem(self, item: CatalogItem) -> None:
+        """
+        Shows given catalog item
+        :param item: catalog item
+        :return: None
+        """
+        changedImage = self.item is None or self.item.imageUrl != item.imageUrl
+        self.setToolTip(f"{item.name} - {item.price} PLN")
+        self.item = item
+        if changedImage:
+            images().request(item.imageUrl, PRODUCT_ICON_SIZE, partial(self._setImage, item.imageUrl))
+
+    def _setImage(self, imageUrl: str, pixmap: QPixmap) -> None:
+        # button could be removed or show other image by the time image is loaded
+        if sip.isdeleted(self) or self.item.imageUrl != imageUrl:
+            return
+        self.setIcon(QIcon(pixmap))
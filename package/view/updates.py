@@ -0,0 +1,108 @@
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Tuple
+
+from PyQt5 import sip
+from PyQt5.QtCore import QEvent, QObject, QTimer
+from PyQt5.QtWidgets import QApplication, QWidget
+
+from package.metrics import timed
+
+
+class UpdateScheduler(QObject):
+    """
+    Collects widget changes made during one event loop turn and applies them together.
+    Only the last change of the same kind on the same widget is applied, and nothing is repainted
+    synchronously, so Qt paints every changed widget once when the loop gets back to it
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._pending: Dict[Tuple[int, str], Tuple[QWidget, Callable[[], None]]] = {}
+        self._scheduled = False
+        self.flushes = 0
+
+    def schedule(self, widget: QWidget, kind: str, apply: Callable[[], None]) -> None:
+        """
+        Schedules widget change
+        :param widget: changed widget
+        :param kind: kind of change, e.g. 'text', later change of the same kind replaces earlier one
+        :param apply: applies the change
+        :return: None
+        """
+        self._pending[(id(widget), kind)] = (widget, apply)
+        if not self._scheduled:
+            self._scheduled = True
+            QTimer.singleShot(0, self.flush)
+
+    def cancel(self, widget: QWidget, kind: str) -> None:
+        """
+        Drops pending change, e.g. when the same change was applied right away
+        :param widget: changed widget
+        :param kind: kind of change
+        :return: None
+        """
+        self._pending.pop((id(widget), kind), None)
+
+    def setPlainText(self, widget: QWidget, text: str) -> None:
+        self.schedule(widget, "text", lambda: widget.setPlainText(text))
+
+    def setEnabled(self, widget: QWidget, enabled: bool) -> None:
+        self.schedule(widget, "enabled", lambda: widget.setEnabled(enabled))
+
+    @timed("ui_update")
+    def flush(self) -> None:
+        """
+        Applies pending changes right away
+        :return: None
+        """
+        pending, self._pending = self._pending, {}
+        self._scheduled = False
+        if not pending:
+            return
+        self.flushes += 1
+        for widget, apply in pending.values():
+            # widget could be deleted in the meantime, e.g. product removed from catalog
+            if not sip.isdeleted(widget):
+                apply()
+
+
+class PaintCounter(QObject):
+    """
+    Counts paint events of all widgets, by widget class. Used to check how many paints a user action costs
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.paints: Counter = Counter()
+        self.actions: Dict[str, int] = {}
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() == QEvent.Paint:
+            self.paints[type(watched).__name__] += 1
+        return False
+
+    def install(self) -> "PaintCounter":
+        QApplication.instance().installEventFilter(self)
+        return self
+
+    def uninstall(self) -> None:
+        QApplication.instance().removeEventFilter(self)
+
+    @property
+    def total(self) -> int:
+        return sum(self.paints.values())
+
+    @contextmanager
+    def action(self, name: str) -> Iterator[None]:
+        """
+        Counts paints caused by an action. Pending events are processed at the end,
+        so paints scheduled by the action are counted too
+        :param name: action name
+        """
+        before = self.total
+        yield
+        application = QApplication.instance()
+        application.processEvents()
+        application.processEvents()
+        self.actions[name] = self.total - before
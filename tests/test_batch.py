@@ -0,0 +1,35 @@
+import unittest
+
+from package.change import OptimalChangeSolver
+
+try:
+    import numpy as np
+    from package.batch import batchChange
+except ImportError:  # batch change is optional
+    np = None
+
+
+@unittest.skipIf(np is None, "requires numpy")
+class BatchChangeTest(unittest.TestCase):
+
+    def assertMatchesScalar(self, values, limits, amounts) -> None:
+        batch = batchChange(amounts, values, limits)
+        solver = OptimalChangeSolver()
+        for row, amount in enumerate(amounts):
+            solved = solver.solve(amount, list(values), list(limits))
+            self.assertEqual(bool(batch.feasible[row]), solved is not None, amount)
+            if solved is not None:
+                self.assertEqual(int(batch.coins[row]), sum(solved), amount)
+                self.assertEqual(int(np.dot(batch.counts[row], values)), amount)
+
+    def test_canonical_system_matches_scalar_solver(self) -> None:
+        self.assertMatchesScalar([500, 200, 100, 50, 20, 10, 5, 2, 1], [2, 3, 1, 0, 4, 2, 1, 5, 3], list(range(1500)))
+
+    def test_non_canonical_system_gives_fewest_coins(self) -> None:
+        batch = batchChange([6], [1, 3, 4], [10, 10, 10])
+        self.assertEqual(batch.counts[0].tolist(), [0, 2, 0])
+        self.assertMatchesScalar([1, 3, 4], [10, 10, 10], list(range(40)))
+
+
+if __name__ == '__main__':
+    unittest.main()
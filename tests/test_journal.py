@@ -0,0 +1,90 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from package.engine import TransactionEngine
+from package.journal import Journal, recover
+from package.model import Machine
+
+
+def sell(machine: Machine) -> None:
+    engine = TransactionEngine(machine.session())
+    engine.selectProduct("Snickers", Decimal("4.00"))
+    engine.chooseCurrency("PLN")
+    engine.choosePaymentType("cash")
+    engine.insertCoin(Decimal("5.00"))
+    engine.pay()
+    engine.reset()
+
+
+class JournalCrashRecoveryTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.path = os.path.join(tempfile.mkdtemp(), "journal.jsonl")
+
+    def test_torn_record_doesnt_hide_later_records(self) -> None:
+        machine = Machine()
+        machine.journal = Journal(self.path, machine)
+        sell(machine)
+        machine.journal.close()
+        # crash in the middle of a write
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write('{"t":"coin","ts":1,"s":"torn","val')
+
+        restarted = Machine()
+        recover(restarted, self.path)
+        restarted.journal = Journal(self.path, restarted)
+        sell(restarted)
+        restarted.journal.close()
+
+        recovered = Machine()
+        recover(recovered, self.path)
+        position = recovered.catalog.byName("Snickers").position
+        self.assertEqual(recovered.stock.available(position), 8)
+        self.assertEqual(recovered.inventory.snapshot(), restarted.inventory.snapshot())
+
+    def test_complete_record_without_newline_is_cut_off(self) -> None:
+        machine = Machine()
+        machine.journal = Journal(self.path, machine)
+        machine.journal.close()
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write('{"t":"reset","ts":1,"s":"torn"}')
+
+        self.assertEqual([record["t"] for record in Journal.read(self.path)], ["init"])
+        Journal(self.path, Machine()).close()
+        with open(self.path, encoding="utf-8") as file:
+            lines = file.readlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith("\n"))
+
+
+class JournalSyncTest(unittest.TestCase):
+
+    def test_records_dont_wait_for_disk(self) -> None:
+        path = os.path.join(tempfile.mkdtemp(), "journal.jsonl")
+        journal = Journal(path, Machine(), batchSize=4, interval=10)
+        threads = []
+        fsync = os.fsync
+
+        def recordingFsync(descriptor: int) -> None:
+            threads.append(threading.current_thread().name)
+            fsync(descriptor)
+
+        with mock.patch("package.journal.os.fsync", recordingFsync):
+            for _ in range(100):
+                journal.record("reset", s="session")
+            deadline = time.monotonic() + 5
+            while not threads and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(threads)
+            self.assertEqual(set(threads), {"journal-sync"})
+        journal.close()
+        self.assertEqual(len(list(Journal.read(path))), 101)
+
+
+if __name__ == '__main__':
+    unittest.main()
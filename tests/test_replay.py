@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from decimal import Decimal
+
+from package.accounts import SqliteAccountRepository
+from package.engine import TransactionEngine
+from package.model import Account, Card, Machine
+from package.replay import replay
+from package.server import createMachine
+
+
+def balances(path: str) -> dict:
+    connection = sqlite3.connect(path)
+    try:
+        return dict(connection.execute("SELECT number, balance FROM cards"))
+    finally:
+        connection.close()
+
+
+class ReplayConfigurationTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.dataDir = tempfile.mkdtemp()
+        self.database = os.path.join(self.dataDir, "accounts.db")
+        accounts = SqliteAccountRepository(self.database)
+        accounts.bulkImport([Account("Anna Nowak", [Card("1111222233334444", Decimal("100.00"), "PLN")])])
+        accounts.close()
+
+        machine = createMachine(self.dataDir, "balanced", slotCapacity=100)
+        for _ in range(20):
+            engine = TransactionEngine(machine.session())
+            engine.selectProduct("Snickers", Decimal("4.00"))
+            engine.chooseCurrency("PLN")
+            engine.choosePaymentType("cash")
+            engine.insertCoin(Decimal("5.00"))
+            engine.insertCoin(Decimal("5.00"))
+            engine.pay()
+            engine.reset()
+        engine = TransactionEngine(machine.session())
+        engine.selectCard(machine.accounts.findAccount("1111222233334444"), machine.findCard("1111222233334444"))
+        engine.selectProduct("Snickers", Decimal("4.00"))
+        engine.chooseCurrency("PLN")
+        engine.choosePaymentType("card")
+        self.assertTrue(engine.pay().ok)
+        machine.journal.close()
+        machine.ledger.close()
+        machine.accounts.close()
+        self.journal = os.path.join(self.dataDir, "journal.jsonl")
+
+    def test_replay_matches_live_configuration(self) -> None:
+        before = balances(self.database)
+        summary = replay(self.journal, createMachine(self.dataDir, "balanced", journal=False))
+        self.assertEqual(summary["mismatches"], [])
+        self.assertEqual(balances(self.database), before)
+
+    def test_default_machine_reports_false_mismatches(self) -> None:
+        self.assertNotEqual(replay(self.journal, Machine())["mismatches"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from package.journal import recover
+from package.model import Machine
+from package.server import Session, createMachine
+from package.stock import SlotStock
+
+
+class SlotRefillTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.dataDir = tempfile.mkdtemp()
+
+    def sell(self, session: Session, name: str) -> dict:
+        response = session.execute({"op": "select", "name": name})
+        if not response["ok"]:
+            return response
+        for request in ({"op": "currency", "currency": "PLN"}, {"op": "payment", "type": "cash"},
+                        {"op": "coin", "value": "5.00"}, {"op": "coin", "value": "5.00"}, {"op": "pay"},
+                        {"op": "reset"}):
+            response = session.execute(request)
+            self.assertTrue(response["ok"], response)
+        return response
+
+    def test_refill_is_recovered_from_journal(self) -> None:
+        machine = createMachine(self.dataDir, slotCapacity=2)
+        session = Session(machine)
+        self.sell(session, "Kawa")
+        self.sell(session, "Kawa")
+        self.assertFalse(self.sell(session, "Kawa")["ok"])
+
+        response = session.execute({"op": "refill", "name": "Kawa", "quantity": 5})
+        self.assertEqual(response, {"id": None, "ok": True, "result": {"name": "Kawa", "available": 5}})
+        self.sell(session, "Kawa")
+        machine.journal.close()
+        machine.ledger.close()
+
+        recovered = Machine()
+        recover(recovered, os.path.join(self.dataDir, "journal.jsonl"))
+        self.assertEqual(recovered.stock.available(recovered.catalog.byName("Kawa").position), 4)
+
+    def test_refill_to_slot_capacity(self) -> None:
+        machine = Machine(stock=SlotStock(capacity=3))
+        session = Session(machine)
+        self.sell(session, "Kawa")
+        self.assertEqual(session.execute({"op": "refill", "name": "Kawa"})["result"]["available"], 3)
+        self.assertFalse(session.execute({"op": "refill", "name": "Kawa", "quantity": -1})["ok"])
+        self.assertFalse(session.execute({"op": "refill", "name": "Kawa", "quantity": "7"})["ok"])
+
+
+if __name__ == '__main__':
+    unittest.main()